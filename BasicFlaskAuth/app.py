@@ -1,15 +1,22 @@
-from flask import Flask, request, abort
+import os
+from flask import Flask, request, abort, jsonify
 import json
 from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
 
+from token_cache import TokenCache, TOKEN_CACHE_SIZE
+
 app = Flask(__name__)
 
 AUTH0_DOMAIN = 'noradai.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'image'
 
+# verified payloads of the tokens seen recently, see /auth/metrics
+token_cache = TokenCache(
+    int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', TOKEN_CACHE_SIZE)))
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -123,7 +130,7 @@ def requires_auth(permission=''):
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
             try:
-                payload = verify_decode_jwt(token)
+                payload = token_cache.verify(token, verify_decode_jwt)
             except:
                 abort(401)
             
@@ -139,3 +146,7 @@ def requires_auth(permission=''):
 def headers(payload):
     print(payload)
     return 'Access Granted'
+
+@app.route('/auth/metrics')
+def auth_metrics():
+    return jsonify(token_cache.snapshot())
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+TOKEN_CACHE_SIZE = 1024
+LATENCY_SAMPLES = 1024
+
+
+class TokenCache:
+    """Payloads of verified tokens, kept until the token's exp.
+
+    Entries are keyed by the SHA-256 digest of the token, so the cache
+    does not hold the bearer tokens themselves. When max_entries is
+    reached expired entries are dropped first, then the least recently
+    used. Tokens without an exp claim are verified on every request.
+    Payloads are shared between requests and must not be modified.
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.next_expiry = float('inf')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def verify(self, token, verify_token):
+        """Returns the cached payload of token, or verify_token(token).
+
+        Errors raised by verify_token are not cached.
+        """
+        key = self.key(token)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        start = time.perf_counter()
+        payload = verify_token(token)
+        seconds = time.perf_counter() - start
+        with self.lock:
+            self.latencies.append(seconds)
+        self.put(key, payload)
+        return payload
+
+    def put(self, key, payload):
+        expires = payload.get('exp') if isinstance(payload, dict) else None
+        if not isinstance(expires, (int, float)) or self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (expires, payload)
+            self.entries.move_to_end(key)
+            self.next_expiry = min(self.next_expiry, expires)
+            if len(self.entries) > self.max_entries:
+                self.drop_expired(time.time())
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def drop_expired(self, now):
+        # scans only once the earliest known exp has passed
+        if self.next_expiry > now:
+            return
+        expired = [key for key, (expires, _) in self.entries.items()
+                   if expires <= now]
+        for key in expired:
+            del self.entries[key]
+        self.expirations += len(expired)
+        self.next_expiry = min(
+            (expires for expires, _ in self.entries.values()),
+            default=float('inf'))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.next_expiry = float('inf')
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            lookups = self.hits + self.misses
+            snapshot = {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+        def percentile(fraction):
+            index = min(len(latencies) - 1, int(len(latencies) * fraction))
+            return round(latencies[index] * 1000, 3)
+
+        if latencies:
+            snapshot['verify_ms'] = {
+                'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 3)
+            }
+        return snapshot
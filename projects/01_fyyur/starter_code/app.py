@@ -3,9 +3,9 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import threading
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -13,6 +13,11 @@ import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from search_index import NgramIndex
+from cache import make_cache
+from db_pool import pool_status
+from formatting import format_datetime, format_datetimes
+import bulk
 from datetime import datetime
 #----------------------------------------------------------------------------#
 # App Config.
@@ -24,10 +29,15 @@ app.config.from_object('config')
 db = SQLAlchemy(app)
 
 migrate = Migrate(app, db)
+cache = make_cache(app.config['CACHE_URL'])
 
 
 # TODO: connect to a local postgresql database -> DONE
 
+SHOWS_PER_PAGE = 30
+SEARCH_CHUNK = 500
+CACHE_TTL = 300
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -47,7 +57,9 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venue', lazy=True)
+    # maintained by adjust_upcoming_show_counts and refresh_upcoming_show_counts
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Show', backref='venue', lazy=True, cascade='all, delete', passive_deletes=True)
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate -> DONE
 
@@ -66,7 +78,9 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref="artist", lazy=True)
+    # maintained by adjust_upcoming_show_counts and refresh_upcoming_show_counts
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Show', backref="artist", lazy=True, cascade='all, delete', passive_deletes=True)
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate -> DONE
 
@@ -77,22 +91,396 @@ class Show(db.Model):
 
   id = db.Column(db.Integer, primary_key=True)
   time = db.Column(db.DateTime, nullable=False)
-  venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+
+  # supports keyset pagination of the show listing
+  __table_args__ = (db.Index('ix_shows_time_id', 'time', 'id'),)
 
 db.create_all()
 #----------------------------------------------------------------------------#
-# Filters.
+# Queries.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+def adjust_upcoming_show_counts(venue_id, artist_id, delta):
+  '''Adds delta to the upcoming show counters of a venue and an artist.'''
+  Venue.query.filter(Venue.id == venue_id).update(
+    {Venue.num_upcoming_shows: Venue.num_upcoming_shows + delta},
+    synchronize_session=False)
+  Artist.query.filter(Artist.id == artist_id).update(
+    {Artist.num_upcoming_shows: Artist.num_upcoming_shows + delta},
+    synchronize_session=False)
+
+def release_upcoming_shows(owner_column, owner_ids, other_model, other_column):
+  '''
+  release_upcoming_shows(owner_column, owner_ids, other_model, other_column)
+    takes the upcoming shows of the given venues (or artists) off the
+    counters of the artists (or venues) they play with, in one statement,
+    before those shows are deleted
+  '''
+  now = datetime.utcnow()
+  released = db.session.query(db.func.count(Show.id)).\
+    filter(other_column == other_model.id).\
+    filter(owner_column.in_(owner_ids)).\
+    filter(Show.time >= now).\
+    correlate(other_model).\
+    as_scalar()
+  other_ids = db.session.query(other_column).\
+    filter(owner_column.in_(owner_ids)).\
+    filter(Show.time >= now)
+  other_model.query.filter(other_model.id.in_(other_ids)).update(
+    {other_model.num_upcoming_shows: other_model.num_upcoming_shows - released},
+    synchronize_session=False)
+
+def refresh_upcoming_show_counts():
+  '''
+  refresh_upcoming_show_counts()
+    recounts upcoming shows for every venue and artist. Counters only grow
+    or shrink on writes, so this has to run on a schedule to retire shows
+    that have moved into the past (see `flask refresh-upcoming-show-counts`).
+  '''
+  now = datetime.utcnow()
+  for model, owner_column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    upcoming = db.session.query(db.func.count(Show.id)).\
+      filter(owner_column == model.id).\
+      filter(Show.time >= now).\
+      correlate(model).\
+      as_scalar()
+    model.query.update(
+      {model.num_upcoming_shows: upcoming},
+      synchronize_session=False)
+  db.session.commit()
+  cache.invalidate('venues')
+
+@app.cli.command('refresh-upcoming-show-counts')
+def refresh_upcoming_show_counts_command():
+  '''Recount upcoming shows of every venue and artist.'''
+  refresh_upcoming_show_counts()
+
+def venue_directory():
+  '''
+  venue_directory()
+    lists venues grouped by state and city with the number of upcoming shows
+    of each venue, in a single statement
+  '''
+  rows = db.session.query(
+      Venue.state,
+      Venue.city,
+      Venue.id,
+      Venue.name,
+      Venue.num_upcoming_shows
+    ).order_by(Venue.state, Venue.city, Venue.id).\
+    all()
+
+  data = []
+  for state, city, venue_id, name, num_upcoming_shows in rows:
+    # rows are sorted, so a new area starts whenever state or city changes
+    if not data or data[-1]['state'] != state or data[-1]['city'] != city:
+      data.append({'city': city, 'state': state, 'venues': []})
+    data[-1]['venues'].append({
+      'id': venue_id,
+      'name': name,
+      'num_upcoming_shows': num_upcoming_shows
+    })
+
+  return data
+
+def artist_listing():
+  '''Lists the id and name of every artist.'''
+  rows = db.session.query(Artist.id, Artist.name).order_by(Artist.id)
+  return [{'id': artist_id, 'name': name} for artist_id, name in rows]
+
+def show_listing(after=None, limit=SHOWS_PER_PAGE):
+  '''
+  show_listing(after, limit)
+    lists up to limit shows with their venue and artist in one joined
+    statement, ordered by (time, id) and starting after the given
+    (time, id) cursor. Returns the shows and the cursor of the next page,
+    or None on the last page.
+  '''
+  query = db.session.query(
+      Show.id,
+      Show.time,
+      Show.venue_id,
+      Venue.name,
+      Show.artist_id,
+      Artist.name,
+      Artist.image_link
+    ).join(Show.venue).\
+    join(Show.artist)
+  if after is not None:
+    query = query.filter(db.tuple_(Show.time, Show.id) > db.tuple_(*after))
+  # fetch one extra row to learn whether another page follows
+  rows = query.order_by(Show.time, Show.id).limit(limit + 1).all()
+
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = (rows[-1].time, rows[-1].id)
+
+  # format the whole page at once, and keep the result with cached pages
+  formatted_times = format_datetimes([row.time for row in rows], 'full')
+  data = []
+  for row, formatted_time in zip(rows, formatted_times):
+    show_id, time, venue_id, venue_name, artist_id, artist_name, artist_image_link = row
+    data.append({
+      'venue_id': venue_id,
+      'venue_name': venue_name,
+      'artist_id': artist_id,
+      'artist_name': artist_name,
+      'artist_image_link': artist_image_link,
+      'start_time': str(time),
+      'formatted_start_time': formatted_time
+    })
+
+  return data, next_cursor
+
+# in-memory name indexes used when the database has no pg_trgm, keyed by model
+name_indexes = {}
+# held while an index is built and published, so writes that commit during
+# the build wait for it and are applied to the published index
+name_indexes_lock = threading.Lock()
+
+def name_index(model):
+  '''Returns the in-memory name index of model, building it on first use.'''
+  index = name_indexes.get(model)
+  if index is not None:
+    return index
+  with name_indexes_lock:
+    index = name_indexes.get(model)
+    if index is None:
+      index = NgramIndex()
+      for id, name in db.session.query(model.id, model.name):
+        index.add(id, name)
+      name_indexes[model] = index
+  return index
+
+def reindex_name(model, id, name=None):
+  '''Updates a built in-memory name index after a write; name=None removes.'''
+  with name_indexes_lock:
+    index = name_indexes.get(model)
+    if index is None:
+      return
+    if name is None:
+      index.remove(id)
+    else:
+      index.add(id, name)
+
+def search_by_name(model, term):
+  '''
+  search_by_name(model, term)
+    case-insensitive partial match of term against model.name, best matches
+    first. On PostgreSQL the ILIKE is served by the pg_trgm GIN index and the
+    total comes from a window count in the same statement; elsewhere the
+    in-memory n-gram index is used.
+    Returns the number of matches and (id, name, num_upcoming_shows) rows.
+  '''
+  if db.engine.dialect.name == 'postgresql':
+    pattern = '%{}%'.format(
+      term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    rows = db.session.query(
+        model.id,
+        model.name,
+        model.num_upcoming_shows,
+        db.func.count().over()
+      ).filter(model.name.ilike(pattern, escape='\\')).\
+      order_by(db.func.similarity(model.name, term).desc(), model.id).\
+      all()
+    count = rows[0][3] if rows else 0
+    return count, [row[:3] for row in rows]
+
+  ids = name_index(model).search(term)
+  found = {}
+  for start in range(0, len(ids), SEARCH_CHUNK):
+    chunk = ids[start:start + SEARCH_CHUNK]
+    for row in db.session.query(model.id, model.name, model.num_upcoming_shows).\
+        filter(model.id.in_(chunk)):
+      found[row[0]] = tuple(row)
+  rows = [found[id] for id in ids if id in found]
+  return len(rows), rows
+
+VENUE_DETAIL_FIELDS = (
+  'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+  'facebook_link', 'seeking_talent', 'seeking_description', 'image_link'
+)
+ARTIST_DETAIL_FIELDS = (
+  'id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+  'facebook_link', 'seeking_venue', 'seeking_description', 'image_link'
+)
+
+def load_detail(model, entity_id, fields, other):
+  '''
+  load_detail(model, entity_id, fields, other)
+    loads a venue or artist together with its shows and the other side of
+    each show ('artist' or 'venue') in one joined statement, and splits past
+    from upcoming shows in a single pass.
+    Returns the payload and the time of the next upcoming show, or None if
+    there is no such entity.
+  '''
+  entity = model.query.\
+    options(db.joinedload(model.shows).joinedload(getattr(Show, other))).\
+    get(entity_id)
+  if entity is None:
+    return None
+
+  data = {field: getattr(entity, field) for field in fields}
+  now = datetime.utcnow()
+  past_shows = []
+  upcoming_shows = []
+  next_show_time = None
+  for show in sorted(entity.shows, key=lambda show: show.time):
+    counterpart = getattr(show, other)
+    show_item = {
+      other + '_id': counterpart.id,
+      other + '_name': counterpart.name,
+      other + '_image_link': counterpart.image_link,
+      'start_time': str(show.time)
+    }
+    if show.time < now:
+      past_shows.append(show_item)
+    else:
+      if next_show_time is None:
+        next_show_time = show.time
+      upcoming_shows.append(show_item)
+  data['past_shows'] = past_shows
+  data['upcoming_shows'] = upcoming_shows
+  data['past_shows_count'] = len(past_shows)
+  data['upcoming_shows_count'] = len(upcoming_shows)
+
+  return data, next_show_time
+
+def detail_key(model, entity_id):
+  return 'detail:{}:{}'.format(model.__tablename__, int(entity_id))
+
+def cached_detail(model, entity_id, fields, other):
+  '''
+  cached_detail(model, entity_id, fields, other)
+    load_detail() through the view cache. An entry lives for CACHE_TTL
+    seconds, but no longer than the start of the next upcoming show, when
+    that show has to move to the past shows.
+  '''
+  key = detail_key(model, entity_id)
+  data = cache.get(key)
+  if data is not None:
+    return data
+
+  loaded = load_detail(model, entity_id, fields, other)
+  if loaded is None:
+    return None
+  data, next_show_time = loaded
+  ttl = CACHE_TTL
+  if next_show_time is not None:
+    ttl = min(ttl, (next_show_time - datetime.utcnow()).total_seconds())
+  if ttl > 0:
+    cache.set(key, data, ttl)
+  return data
+
+def invalidate_detail(model, ids):
+  '''Drops the cached detail pages of the given venue or artist ids.'''
+  if ids:
+    cache.invalidate(*[detail_key(model, entity_id) for entity_id in ids])
+
+def show_counterpart_ids(owner_column, other_column, owner_id):
+  '''Ids on the other side of the shows of one venue or artist.'''
+  rows = db.session.query(other_column).\
+    filter(owner_column == owner_id).\
+    distinct()
+  return [row[0] for row in rows]
+
+def bulk_delete(model, ids):
+  '''
+  bulk_delete(model, ids)
+    deletes the venues or artists with the given ids together with their
+    shows, using one set-based DELETE per table, commits, and then brings
+    name indexes and cached views in step.
+    Returns the number of deleted rows per table.
+  '''
+  ids = [int(entity_id) for entity_id in ids]
+  if model is Venue:
+    owner_column, other_model, other_column = Show.venue_id, Artist, Show.artist_id
+  else:
+    owner_column, other_model, other_column = Show.artist_id, Venue, Show.venue_id
+  other_ids = [row[0] for row in db.session.query(other_column).
+    filter(owner_column.in_(ids)).
+    distinct()]
+
+  release_upcoming_shows(owner_column, ids, other_model, other_column)
+  # shows are deleted explicitly (rather than by ON DELETE CASCADE) to count them
+  deleted_shows = Show.query.filter(owner_column.in_(ids)).\
+    delete(synchronize_session=False)
+  deleted = model.query.filter(model.id.in_(ids)).\
+    delete(synchronize_session=False)
+  db.session.commit()
+
+  for entity_id in ids:
+    reindex_name(model, entity_id)
+  invalidate_detail(model, ids)
+  invalidate_detail(other_model, other_ids)
+  # the venue directory shows upcoming show counts, so it changes either way;
+  # the artist listing only holds names and changes when artists go
+  cache.invalidate(*{model.__tablename__, 'venues'})
+  cache.invalidate_namespace('shows')
+  return {model.__tablename__: deleted, 'shows': deleted_shows}
+
+#----------------------------------------------------------------------------#
+# Bulk import and export.
+#----------------------------------------------------------------------------#
 
+BULK_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+BULK_CHUNK = 5000
+
+def bulk_format(path, format):
+  if format is not None:
+    return format
+  return 'csv' if path.endswith('.csv') else 'ndjson'
+
+def invalidate_imported(model, rows):
+  '''Drops the views that the imported rows of one chunk change.'''
+  if model is Show:
+    invalidate_detail(Venue, {row['venue_id'] for row in rows})
+    invalidate_detail(Artist, {row['artist_id'] for row in rows})
+    cache.invalidate_namespace('shows')
+  else:
+    with name_indexes_lock:
+      name_indexes.pop(model, None)
+    cache.invalidate(model.__tablename__)
+
+@app.cli.command('import-data')
+@click.argument('table', type=click.Choice(sorted(BULK_MODELS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to csv for .csv files and ndjson otherwise.')
+@click.option('--chunk-size', default=BULK_CHUNK, show_default=True)
+def import_data(table, source, format, chunk_size):
+  '''Stream CSV or NDJSON records into venues, artists or shows.'''
+  model = BULK_MODELS[table]
+  records = bulk.read_records(source, bulk_format(source.name, format))
+  report = bulk.import_records(
+    db.engine, model.__table__, records, chunk_size,
+    on_chunk=lambda rows: invalidate_imported(model, rows))
+  if model is Show:
+    refresh_upcoming_show_counts()
+  for record, reason in report.rejected[:20]:
+    click.echo('rejected {}: {}'.format(json.dumps(record, default=bulk.json_default), reason), err=True)
+  click.echo('{} rows inserted, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+    report.inserted, len(report.rejected), report.seconds, report.rows_per_second))
+
+@app.cli.command('export-data')
+@click.argument('table', type=click.Choice(sorted(BULK_MODELS)))
+@click.argument('target', type=click.File('w'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to csv for .csv files and ndjson otherwise.')
+def export_data(table, target, format):
+  '''Stream every row of venues, artists or shows as CSV or NDJSON.'''
+  model = BULK_MODELS[table]
+  count = bulk.export_rows(db.engine, model.__table__, target, bulk_format(target.name, format))
+  click.echo('{} rows exported'.format(count), err=True)
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+# format_datetime and format_datetimes are defined in formatting.py
 app.jinja_env.filters['datetime'] = format_datetime
 
 #----------------------------------------------------------------------------#
@@ -111,44 +499,7 @@ def index():
 def venues():
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue. -> DONE
-  data = []
-  # select state
-  state_list = []
-  venues = Venue.query.all()
-  for venue in venues:
-    state = venue.state
-    if state in state_list:
-      continue
-    else:
-      state_list.append(state)
-  # for each state, list cities and venues inside it.
-  for state in state_list:
-    venues = Venue.query.filter(Venue.state == state)
-    # select city
-    city_list = []
-    for venue in venues:
-      city = venue.city
-      if city in city_list:
-        continue
-      else:
-        city_list.append(city)
-    # list all venues in each city
-    for city in city_list:
-      data_item = {}
-      data_item['city'] = city
-      data_item['state'] = state
-      venues = Venue.query.filter(Venue.city == city)
-      venues_in_city = []
-      for venue in venues:
-        venue_item = {}
-        venue_item['id'] = venue.id
-        venue_item['name'] = venue.name
-        shows = Show.query.filter(Show.venue_id == venue.id).filter(Show.time >= datetime.utcnow())
-        # shows = Show.query.filter(Show.venue_id == id).filter(Show.time >= '2020-05-06 12:00:00')
-        venue_item['num_upcoming_shows'] = shows.count()
-        venues_in_city.append(venue_item)
-      data_item['venues'] = venues_in_city
-      data.append(data_item)
+  data = cache.fetch('venues', venue_directory, CACHE_TTL)
 
   return render_template('pages/venues.html', areas=data);
 
@@ -159,19 +510,15 @@ def search_venues():
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   # -> DONE
   response = {}
-  response_term = request.form.get('search_term')
-  venues = Venue.query.filter(Venue.name.ilike('%' + response_term + '%'))
-  count = venues.count()
+  response_term = request.form.get('search_term', '')
+  count, venues = search_by_name(Venue, response_term)
   response['count'] = count
   data = []
-  for venue in venues:
+  for id, name, num_upcoming_shows in venues:
     venue_item = {}
-    id = venue.id
-    name = venue.name
     venue_item['id'] = id
     venue_item['name'] = name
-    shows = Show.query.filter(Show.venue_id == venue.id).filter(Show.time >= datetime.utcnow())
-    venue_item['num_upcoming_shows'] = shows.count()
+    venue_item['num_upcoming_shows'] = num_upcoming_shows
     data.append(venue_item)
   response['data'] = data
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
@@ -180,68 +527,9 @@ def search_venues():
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id -> DONE.
-  venue = Venue.query.get(venue_id)
-  # query venue data
-  data = {}
-  id = venue.id
-  name = venue.name
-  genres = venue.genres
-  address = venue.address
-  city = venue.city
-  state = venue.state
-  phone = venue.phone
-  website = venue.website
-  facebook_link = venue.facebook_link
-  data['id'] = id
-  data['name'] = name
-  data['genres'] = genres
-  data['city'] = city
-  data['state'] = state
-  data['phone'] = phone
-  data['website'] = website
-  data['facebook_link'] = facebook_link
-  seeking_talent = venue.seeking_talent
-  data['seeking_talent'] = seeking_talent
-  if seeking_talent:
-    seeking_description = venue.seeking_description
-    data['seeking_description'] = seeking_description
-  image_link = venue.image_link
-  data['image_link'] = image_link
-  # query shows data
-  shows = Show.query.join(Show.artist).filter(Show.venue_id == venue_id)
-  past_show_list = []
-  upcoming_show_list = []
-  past_shows = shows.filter(Show.time < datetime.utcnow())
-  past_shows_count = past_shows.count()
-  # print(type(past_shows), len(past_shows))
-  upcoming_shows = shows.filter(Show.time >= datetime.utcnow())
-  upcoming_shows_count = upcoming_shows.count()
-  data['past_shows_count'] = past_shows_count
-  data['upcoming_shows_count'] = upcoming_shows_count
-  for past_show in past_shows:
-    past_show_item = {}
-    artist_id = past_show.artist_id
-    artist_name = past_show.artist.name
-    artist_image_link = past_show.artist.image_link
-    start_time = past_show.time
-    past_show_item['artist_id'] = artist_id
-    past_show_item['artist_name'] = artist_name
-    past_show_item['artist_image_link'] = artist_image_link
-    past_show_item['start_time'] = str(start_time)
-    past_show_list.append(past_show_item)
-  data['past_shows'] = past_show_list
-  for upcoming_show in upcoming_shows:
-    upcoming_show_item = {}
-    artist_id = upcoming_show.artist_id
-    artist_name = upcoming_show.artist.name
-    artist_image_link = upcoming_show.artist.image_link
-    start_time = upcoming_show.time
-    upcoming_show_item['artist_id'] = artist_id
-    upcoming_show_item['artist_name'] = artist_name
-    upcoming_show_item['artist_image_link'] = artist_image_link
-    upcoming_show_item['start_time'] = str(start_time)
-    upcoming_show_list.append(upcoming_show_item)
-  data['upcoming_shows'] = upcoming_show_list
+  data = cached_detail(Venue, venue_id, VENUE_DETAIL_FIELDS, 'artist')
+  if data is None:
+    abort(404)
 
   return render_template('pages/show_venue.html', venue=data)
 
@@ -280,6 +568,8 @@ def create_venue_submission():
     )
     db.session.add(venue)
     db.session.commit()
+    reindex_name(Venue, venue.id, venue.name)
+    cache.invalidate('venues')
   except:
     db.session.rollback()
     error = True
@@ -301,14 +591,12 @@ def delete_venue(venue_id):
   # -> DONE
   error = False
   try:
-    venue = Venue.query.get(venue_id)
-    # delete related shows
-    shows = Show.query.filter(Show.venue_id == venue_id)
-    shows.delete()
-    # delete the venue
-    db.session.delete(venue)
-    db.session.commit()
-    flash('Venue ' + venue.name + ' was successfully deleted!')
+    name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+    if name is None:
+      raise LookupError(venue_id)
+    # delete the venue and its shows
+    bulk_delete(Venue, [venue_id])
+    flash('Venue ' + name + ' was successfully deleted!')
   except:
     db.session.rollback()
     error = True
@@ -320,19 +608,31 @@ def delete_venue(venue_id):
   # clicking that button delete it from the db then redirect the user to the homepage
   # return None
 
+def bulk_delete_response(model):
+  body = request.get_json(silent=True) or {}
+  ids = body.get('ids')
+  if not isinstance(ids, list) or not all(isinstance(entity_id, int) for entity_id in ids):
+    return jsonify({'success': False, 'message': 'ids must be a list of integers'}), 400
+  try:
+    deleted = bulk_delete(model, ids)
+  except:
+    db.session.rollback()
+    return jsonify({'success': False, 'message': 'could not delete'}), 500
+  finally:
+    db.session.close()
+  return jsonify({'success': True, 'deleted': deleted})
+
+@app.route('/venues', methods=['DELETE'])
+def delete_venues():
+  # deletes many venues and their shows, e.g. {"ids": [1, 2, 3]}
+  return bulk_delete_response(Venue)
+
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
   # TODO: replace with real data returned from querying the database -> DONE
-  data = []
-  artists = Artist.query.all()
-  # list artist id and name
-  for artist in artists:
-    data_item = {}
-    data_item['id'] = artist.id
-    data_item['name'] = artist.name
-    data.append(data_item)
+  data = cache.fetch('artists', artist_listing, CACHE_TTL)
 
   return render_template('pages/artists.html', artists=data)
 
@@ -342,20 +642,16 @@ def search_artists():
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   # -> DONE.
-  response_term = request.form.get('search_term')
+  response_term = request.form.get('search_term', '')
   response = {}
-  artists = Artist.query.filter(Artist.name.ilike('%' + response_term + '%'))
-  count = artists.count()
+  count, artists = search_by_name(Artist, response_term)
   response['count'] = count
   data = []
-  for artist in artists:
+  for id, name, num_upcoming_shows in artists:
     artist_item = {}
-    id = artist.id
-    name = artist.name
     artist_item['id'] = id
     artist_item['name'] = name
-    shows = Show.query.filter(Show.artist_id == artist.id).filter(Show.time >= datetime.utcnow())
-    artist_item['num_upcoming_shows'] = shows.count()
+    artist_item['num_upcoming_shows'] = num_upcoming_shows
     data.append(artist_item)
   response['data'] = data
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
@@ -364,67 +660,17 @@ def search_artists():
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id -> DONE.
-  data = {}
-  artist = Artist.query.get(artist_id)
-  # artist query
-  id = artist.id
-  name = artist.name
-  genres = artist.genres
-  city = artist.city
-  state = artist.state
-  phone = artist.phone
-  website = artist.website
-  facebook_link = artist.facebook_link
-  seeking_venue = artist.seeking_venue
-  data['id'] = id
-  data['name'] = name
-  data['genres'] = genres
-  data['city'] = city
-  data['state'] = state
-  data['phone'] = phone
-  data['website'] = website
-  data['facebook_link'] = facebook_link
-  data['seeking_venue'] = seeking_venue
-  if seeking_venue:
-    seeking_description = artist.seeking_description
-    data['seeking_description'] = seeking_description
-  image_link = artist.image_link
-  data['image_link'] = image_link
-  # shows query
-  shows = Show.query.join(Show.venue).filter(Show.artist_id == artist_id)
-  past_shows = shows.filter(Show.time < datetime.utcnow())
-  upcoming_shows = shows.filter(Show.time >= datetime.utcnow())
-  data['past_shows_count'] = past_shows.count()
-  data['upcoming_shows_count'] = upcoming_shows.count()
-  past_show_list = []
-  upcoming_show_list = []
-  for past_show in past_shows:
-    past_show_item = {}
-    venue_id = past_show.venue_id
-    venue_name = past_show.venue.name
-    venue_image_link = past_show.venue.image_link
-    start_time = past_show.time
-    past_show_item['venue_id'] = venue_id
-    past_show_item['venue_name'] = venue_name
-    past_show_item['venue_image_link'] = venue_image_link
-    past_show_item['start_time'] = str(start_time)
-    past_show_list.append(past_show_item)
-  data['past_shows'] = past_show_list
-  for upcoming_show in upcoming_shows:
-    upcoming_show_item = {}
-    venue_id = upcoming_show.venue_id
-    venue_name = upcoming_show.venue.name
-    venue_image_link = upcoming_show.venue.image_link
-    start_time = upcoming_show.time
-    upcoming_show_item['venue_id'] = venue_id
-    upcoming_show_item['venue_name'] = venue_name
-    upcoming_show_item['venue_image_link'] = venue_image_link
-    upcoming_show_item['start_time'] = str(start_time)
-    upcoming_show_list.append(upcoming_show_item)
-  data['upcoming_shows'] = upcoming_show_list
+  data = cached_detail(Artist, artist_id, ARTIST_DETAIL_FIELDS, 'venue')
+  if data is None:
+    abort(404)
 
   return render_template('pages/show_artist.html', artist=data)
 
+@app.route('/artists', methods=['DELETE'])
+def delete_artists():
+  # deletes many artists and their shows, e.g. {"ids": [1, 2, 3]}
+  return bulk_delete_response(Artist)
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -465,6 +711,11 @@ def edit_artist_submission(artist_id):
     artist.genres = genres
     artist.facebook_link = facebook_link
     db.session.commit()
+    reindex_name(Artist, artist_id, name)
+    invalidate_detail(Artist, [artist_id])
+    invalidate_detail(Venue, show_counterpart_ids(Show.artist_id, Show.venue_id, artist_id))
+    cache.invalidate('artists')
+    cache.invalidate_namespace('shows')
   except:
     db.session.rollback()
     error = True
@@ -517,6 +768,11 @@ def edit_venue_submission(venue_id):
     venue.genres = genres
     venue.facebook_link = facebook_link
     db.session.commit()
+    reindex_name(Venue, venue_id, name)
+    invalidate_detail(Venue, [venue_id])
+    invalidate_detail(Artist, show_counterpart_ids(Show.venue_id, Show.artist_id, venue_id))
+    cache.invalidate('venues')
+    cache.invalidate_namespace('shows')
   except:
     db.session.rollback()
     error = True
@@ -562,6 +818,8 @@ def create_artist_submission():
     )
     db.session.add(artist)
     db.session.commit()
+    reindex_name(Artist, artist.id, artist.name)
+    cache.invalidate('artists')
   except:
     db.session.rollback()
     error = True
@@ -584,33 +842,29 @@ def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue. ->DONE.
-  data = []
-  shows = Show.query.all()
-  venues = Venue.query.all()
-  artists = Artist.query.all()
-  # list venue_id, venue_name, artist_id, artist_name, atrist_image_link, start_time for each show
-  for show in shows:
-    data_item = {}
-    # venue data
-    venue_id = show.venue_id
-    venue_name = Venue.query.get(venue_id).name
-    data_item['venue_id'] = venue_id
-    data_item['venue_name'] = venue_name
-    # artist data
-    artist_id = show.artist_id
-    artist = Artist.query.get(artist_id)
-    artist_name = artist.name
-    artist_image_link = artist.image_link
-    data_item['artist_id'] = artist_id
-    data_item['artist_name'] = artist_name
-    data_item['artist_image_link'] = artist_image_link
-    # show data
-    start_time = str(show.time)
-    data_item['start_time'] = start_time
-    data.append(data_item)
-  print(data)
-
-  return render_template('pages/shows.html', shows=data)
+  # shows are paged by the (start time, id) of the last show on the previous page
+  cursor = None
+  page_key = 'first'
+  after = request.args.get('after')
+  after_id = request.args.get('after_id', type=int)
+  if after and after_id is not None:
+    try:
+      cursor = (datetime.fromisoformat(after), after_id)
+      page_key = '{}/{}'.format(cursor[0].isoformat(), after_id)
+    except ValueError:
+      cursor = None
+  key = cache.namespace('shows') + page_key
+  page = cache.get(key)
+  if page is None:
+    data, next_cursor = show_listing(after=cursor)
+    if next_cursor is not None:
+      next_cursor = [next_cursor[0].isoformat(), next_cursor[1]]
+    page = {'shows': data, 'next_cursor': next_cursor}
+    cache.set(key, page, CACHE_TTL)
+  data = page['shows']
+  next_cursor = page['next_cursor']
+
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -629,13 +883,16 @@ def create_show_submission():
     venue_id = new_show.venue_id.data
     start_time = new_show.start_time.data
 
-    show = Show(time = start_time)
-    artist = Artist.query.get(artist_id)
-    venue = Venue.query.get(venue_id)
-    show.artist = artist
-    show.venue = venue
+    # the foreign keys reject unknown ids, so no lookups are needed
+    show = Show(time=start_time, venue_id=venue_id, artist_id=artist_id)
     db.session.add(show)
+    if start_time >= datetime.utcnow():
+      adjust_upcoming_show_counts(venue_id, artist_id, 1)
     db.session.commit()
+    invalidate_detail(Venue, [venue_id])
+    invalidate_detail(Artist, [artist_id])
+    cache.invalidate('venues')
+    cache.invalidate_namespace('shows')
   except:
     db.session.rollback()
     error = True
@@ -650,6 +907,20 @@ def create_show_submission():
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+#  Cache
+#  ----------------------------------------------------------------
+
+@app.route('/cache/metrics')
+def cache_metrics():
+  return jsonify(cache.metrics())
+
+#  Connection pool
+#  ----------------------------------------------------------------
+
+@app.route('/pool/metrics')
+def pool_metrics():
+  return jsonify(pool_status(db.engine))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,11 @@
+'''
+Benchmarks for Fyyur.
+
+Database benchmarks seed the venues, artists and shows tables with
+generated rows, so they refuse to run unless DATABASE_URL points at a
+scratch database:
+
+    $ createdb fyyur_bench
+    $ export DATABASE_URL=postgres://localhost:5432/fyyur_bench
+    $ python -m benchmarks.venue_directory
+'''
@@ -0,0 +1,61 @@
+'''
+Deletes a batch of venues with the previous one-venue-per-request path and
+with bulk_delete(), reporting statements, latency and affected rows.
+
+    $ python -m benchmarks.bulk_delete --venues 1000 --shows 100000 --batch 100
+'''
+import argparse
+import time
+from datetime import datetime
+
+# imported before app so the DATABASE_URL check runs first
+from benchmarks.fixtures import count_queries, print_table, reset, seed
+from app import (db, Venue, Artist, Show, bulk_delete,
+                 release_upcoming_shows)
+
+
+def legacy_delete_venues(ids):
+    '''The delete_venue request handler, run once per venue.'''
+    deleted_shows = 0
+    for venue_id in ids:
+        venue = Venue.query.get(venue_id)
+        release_upcoming_shows(Show.venue_id, [venue_id], Artist,
+                               Show.artist_id)
+        deleted_shows += Show.query.filter(Show.venue_id == venue_id).delete()
+        db.session.delete(venue)
+        db.session.commit()
+    return {'venues': len(ids), 'shows': deleted_shows}
+
+
+def upcoming_total():
+    return db.session.query(db.func.sum(Artist.num_upcoming_shows)).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    ids = list(range(1, args.batch + 1))
+    rows = []
+    for label, func in (('per venue', legacy_delete_venues),
+                        ('bulk_delete', lambda ids: bulk_delete(Venue, ids))):
+        seed(args.venues, args.shows)
+        db.session.expire_all()
+        with count_queries() as counter:
+            start = time.perf_counter()
+            deleted = func(ids)
+            seconds = time.perf_counter() - start
+        expected = Show.query.filter(Show.time >= datetime.utcnow()).count()
+        rows.append([label, counter[0], '{:.1f}'.format(seconds * 1000),
+                     deleted['venues'], deleted['shows'],
+                     'yes' if upcoming_total() == expected else 'NO'])
+    print_table(['path', 'queries', 'ms', 'venues', 'shows',
+                 'counters ok'], rows)
+    reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Micro-benchmark for the datetime template filter: the previous
+dateutil + babel.dates.format_datetime path against formatting.py, with
+and without memoized results, and the batch API.
+
+    $ python -m benchmarks.datetime_format --shows 5000
+'''
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from formatting import DATETIME_FORMATS, format_datetime, format_datetimes
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, DATETIME_FORMATS[format])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shows', type=int, default=5000,
+                        help='show times formatted per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    times = [start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+             for _ in range(args.shows)]
+    strings = [str(time) for time in times]
+
+    def uncached(values):
+        format_datetime.cache_clear()
+        return [format_datetime(value, 'full') for value in values]
+
+    cases = [
+        ('legacy, strings',
+         lambda: [legacy_format_datetime(value, 'full') for value in strings]),
+        ('filter, strings, cold', lambda: uncached(strings)),
+        ('filter, datetimes, cold', lambda: uncached(times)),
+        ('filter, datetimes, memoized',
+         lambda: [format_datetime(value, 'full') for value in times]),
+        ('format_datetimes batch', lambda: format_datetimes(times, 'full')),
+    ]
+    assert cases[0][1]() == cases[1][1]() == cases[4][1]()
+
+    print('{} show times, best of {} runs'.format(args.shows, args.repeat))
+    for label, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:>28}  {:8.2f} ms  {:6.2f} us/show'.format(
+            label, best * 1000, best * 1e6 / args.shows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Profiling report for the venue detail page loader: the previous
+four-query loader against load_detail(), cold and through the view cache,
+followed by a cProfile listing of the new loader.
+
+    $ python -m benchmarks.detail_pages --venues 200 --shows 20000
+'''
+import argparse
+import cProfile
+import pstats
+from datetime import datetime
+
+# imported before app so the DATABASE_URL check runs first
+from benchmarks.fixtures import measure, print_table, reset, seed
+from app import (db, Venue, Show, VENUE_DETAIL_FIELDS, cached_detail,
+                 cache, detail_key, load_detail)
+
+
+def legacy_venue_detail(venue_id):
+    '''The loader show_venue used before load_detail.'''
+    venue = Venue.query.get(venue_id)
+    data = {field: getattr(venue, field) for field in VENUE_DETAIL_FIELDS}
+    shows = Show.query.join(Show.artist).filter(Show.venue_id == venue_id)
+    past_shows = shows.filter(Show.time < datetime.utcnow())
+    upcoming_shows = shows.filter(Show.time >= datetime.utcnow())
+    data['past_shows_count'] = past_shows.count()
+    data['upcoming_shows_count'] = upcoming_shows.count()
+    for key, selection in (('past_shows', past_shows),
+                           ('upcoming_shows', upcoming_shows)):
+        data[key] = [{
+            'artist_id': show.artist_id,
+            'artist_name': show.artist.name,
+            'artist_image_link': show.artist.image_link,
+            'start_time': str(show.time)
+        } for show in selection]
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    seed(args.venues, args.shows)
+    venue_id = db.session.query(Show.venue_id).\
+        group_by(Show.venue_id).\
+        order_by(db.func.count(Show.id).desc()).\
+        first()[0]
+
+    def cold():
+        cache.invalidate(detail_key(Venue, venue_id))
+        cached_detail(Venue, venue_id, VENUE_DETAIL_FIELDS, 'artist')
+
+    def warm():
+        cached_detail(Venue, venue_id, VENUE_DETAIL_FIELDS, 'artist')
+
+    rows = []
+    for label, func in (
+            ('legacy', lambda: legacy_venue_detail(venue_id)),
+            ('load_detail (cold)', cold),
+            ('cached_detail (warm)', warm)):
+        seconds, queries = measure(func, args.repeat)
+        rows.append([label, queries, '{:.3f}'.format(seconds * 1000)])
+    print('venue {} with {} shows'.format(
+        venue_id, Show.query.filter(Show.venue_id == venue_id).count()))
+    print_table(['loader', 'queries', 'ms'], rows)
+
+    print()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(args.repeat):
+        db.session.expire_all()
+        load_detail(Venue, venue_id, VENUE_DETAIL_FIELDS, 'artist')
+    profiler.disable()
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    reset()
+
+
+if __name__ == '__main__':
+    main()
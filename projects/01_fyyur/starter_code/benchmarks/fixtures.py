@@ -0,0 +1,142 @@
+'''
+Database fixtures for the Fyyur benchmarks.
+
+Importing this module refuses to continue unless DATABASE_URL points at a
+scratch database, because seeding replaces the venues, artists and shows.
+'''
+import os
+import sys
+
+if 'DATABASE_URL' not in os.environ:
+    sys.exit('Set DATABASE_URL to a scratch database before benchmarking. '
+             'Existing venues, artists and shows will be deleted.')
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db, Venue, Artist, Show, refresh_upcoming_show_counts
+
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'MA', 'OR']
+CITIES_PER_STATE = 5
+NAME_WORDS = ['musical', 'hop', 'park', 'square', 'live', 'music', 'coffee',
+              'dueling', 'pianos', 'bar', 'wild', 'sax', 'band', 'guns',
+              'petals', 'blue', 'note', 'jazz', 'hall', 'garage', 'rock']
+INSERT_CHUNK = 5000
+
+
+@contextmanager
+def count_queries():
+    '''Yields a one-item list holding the number of statements executed.'''
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+
+def measure(func, repeat=5):
+    '''Runs func repeatedly and returns (median seconds, queries per call).'''
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        with count_queries() as counter:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), counter[0]
+
+
+def reset():
+    '''Deletes every show, venue and artist.'''
+    db.session.query(Show).delete()
+    db.session.query(Venue).delete()
+    db.session.query(Artist).delete()
+    db.session.commit()
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+
+
+def random_name(rng, number):
+    words = rng.sample(NAME_WORDS, 3)
+    return 'The {} {} {} {}'.format(*[word.title() for word in words], number)
+
+
+def seed(num_venues, num_shows, num_artists=None, seed_value=0):
+    '''
+    Replaces the tables with num_venues venues, num_artists artists and
+    num_shows shows, half of them in the past and half upcoming.
+    '''
+    rng = random.Random(seed_value)
+    if num_artists is None:
+        num_artists = max(1, num_venues // 10)
+    reset()
+
+    venues = []
+    for i in range(num_venues):
+        state = STATES[i % len(STATES)]
+        venues.append({
+            'id': i + 1,
+            'name': random_name(rng, i + 1),
+            'city': '{} City {}'.format(state, i % CITIES_PER_STATE),
+            'state': state,
+            'address': '{} Main Street'.format(i + 1),
+            'genres': ['Jazz', 'Rock'],
+        })
+    _insert(Venue.__table__, venues)
+
+    artists = []
+    for i in range(num_artists):
+        state = STATES[i % len(STATES)]
+        artists.append({
+            'id': i + 1,
+            'name': random_name(rng, i + 1),
+            'city': '{} City {}'.format(state, i % CITIES_PER_STATE),
+            'state': state,
+            'genres': ['Jazz'],
+        })
+    _insert(Artist.__table__, artists)
+
+    now = datetime.utcnow()
+    shows = []
+    for i in range(num_shows):
+        offset = timedelta(hours=rng.randint(1, 24 * 365))
+        shows.append({
+            'id': i + 1,
+            'time': now + offset if i % 2 else now - offset,
+            'venue_id': rng.randint(1, num_venues),
+            'artist_id': rng.randint(1, num_artists),
+        })
+    _insert(Show.__table__, shows)
+    db.session.commit()
+    refresh_upcoming_show_counts()
+
+
+def parse_sizes(values):
+    '''Parses "venues:shows" pairs given on the command line.'''
+    sizes = []
+    for value in values:
+        num_venues, num_shows = value.split(':')
+        sizes.append((int(num_venues), int(num_shows)))
+    return sizes
+
+
+def print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column)
+              for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width)
+                        for cell, width in zip(row, widths)))
@@ -0,0 +1,68 @@
+'''
+Benchmark for venue name search: the previous ILIKE count-then-iterate
+path against search_by_name (pg_trgm on PostgreSQL, the in-memory n-gram
+index elsewhere).
+
+    $ python -m benchmarks.name_search --sizes 10000 100000 1000000
+'''
+import argparse
+
+# imported before app so the DATABASE_URL check runs first
+from benchmarks.fixtures import measure, print_table, reset, seed
+from app import db, Venue, name_index, name_indexes, search_by_name
+
+TERMS = ['hop', 'music', 'sax band', 'dueling pianos 4']
+
+
+def ensure_trigram_index():
+    # db.create_all() cannot build the index before the extension exists
+    db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    db.session.execute(
+        'CREATE INDEX IF NOT EXISTS ix_venues_name_trgm '
+        'ON venues USING gin (name gin_trgm_ops)')
+    db.session.commit()
+
+
+def ilike_search(term):
+    venues = Venue.query.filter(Venue.name.ilike('%' + term + '%'))
+    venues.count()
+    return [(venue.id, venue.name) for venue in venues]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[10000, 100000, 1000000],
+                        help='numbers of venues to seed')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    backend = db.engine.dialect.name
+    if backend == 'postgresql':
+        ensure_trigram_index()
+
+    rows = []
+    for size in args.sizes:
+        seed(size, 0)
+        if backend == 'postgresql':
+            db.session.execute('ANALYZE venues')
+        else:
+            name_indexes.clear()
+            build, _ = measure(lambda: name_index(Venue), repeat=1)
+            print('n-gram index build at {} venues: {:.2f} ms'.format(
+                size, build * 1000))
+        for term in TERMS:
+            ilike, _ = measure(lambda: ilike_search(term), args.repeat)
+            indexed, _ = measure(lambda: search_by_name(Venue, term),
+                                 args.repeat)
+            count, _ = search_by_name(Venue, term)
+            rows.append([size, repr(term), count,
+                         '{:.2f}'.format(ilike * 1000),
+                         '{:.2f}'.format(indexed * 1000)])
+    reset()
+    print('backend:', backend)
+    print_table(['venues', 'term', 'matches', 'ilike ms', 'indexed ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+'''
+Benchmark for the grouped /venues directory query.
+
+    $ python -m benchmarks.venue_directory --sizes 100:1000 5000:50000
+'''
+import argparse
+
+# imported before app so the DATABASE_URL check runs first
+from benchmarks.fixtures import measure, parse_sizes, print_table, reset, seed
+from app import venue_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+',
+                        default=['100:1000', '1000:10000', '5000:50000'],
+                        help='venues:shows pairs to seed')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for num_venues, num_shows in parse_sizes(args.sizes):
+        seed(num_venues, num_shows)
+        seconds, queries = measure(venue_directory, args.repeat)
+        rows.append([num_venues, num_shows, queries,
+                     '{:.2f}'.format(seconds * 1000)])
+    reset()
+    print_table(['venues', 'shows', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+import sqlalchemy as sa
+import sqlalchemy.exc
+
+FOREIGN_KEY_LOOKUP_CHUNK = 1000
+
+
+class ImportReport:
+    '''Counts of an import run; rejected rows are kept with their reason.'''
+
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_records(stream, format):
+    '''
+    Yields one dict per CSV row or NDJSON line of stream; a line that is
+    not valid JSON yields its error instead, which prepare rejects.
+    '''
+    if format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield error
+
+
+def coerce_value(column, value):
+    '''Converts a CSV/JSON value to the Python type of column.'''
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, sa.ARRAY):
+        if isinstance(value, list):
+            return value
+        if not isinstance(value, str):
+            raise TypeError('{} must be a list, not {!r}'.format(
+                column.name, value))
+        if value.startswith('['):
+            return json.loads(value)
+        return value.split(';')
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is bool:
+        if isinstance(value, bool):
+            return value
+        return str(value).lower() in ('1', 't', 'true', 'yes')
+    if python_type is int:
+        return int(value)
+    if python_type is datetime:
+        if isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(value)
+    return str(value)
+
+
+def required_columns(table):
+    return [column for column in table.columns
+            if not column.nullable and not column.primary_key
+            and column.default is None and column.server_default is None]
+
+
+def prepare(table, records, report):
+    '''Coerces records to table rows, rejecting rows that cannot be inserted.'''
+    required = required_columns(table)
+    rows = []
+    for record in records:
+        if isinstance(record, ValueError):
+            report.rejected.append((getattr(record, 'doc', None),
+                                    'invalid JSON: {}'.format(record)))
+            continue
+        if not isinstance(record, dict):
+            report.rejected.append((record, 'not an object'))
+            continue
+        try:
+            row = {name: coerce_value(table.c[name], value)
+                   for name, value in record.items() if name in table.c}
+        except (TypeError, ValueError) as error:
+            report.rejected.append((record, str(error)))
+            continue
+        missing = [column.name for column in required
+                   if row.get(column.name) is None]
+        if missing:
+            report.rejected.append(
+                (record, 'missing {}'.format(', '.join(missing))))
+            continue
+        rows.append(row)
+    return rows
+
+
+def check_foreign_keys(connection, table, rows, report):
+    '''
+    Keeps the rows whose foreign keys exist, looking up every referenced
+    id of the chunk at once instead of one row at a time.
+    '''
+    for foreign_key in table.foreign_keys:
+        name = foreign_key.parent.name
+        target = foreign_key.column
+        ids = sorted({row[name] for row in rows if row.get(name) is not None})
+        existing = set()
+        for part in chunked(ids, FOREIGN_KEY_LOOKUP_CHUNK):
+            selection = sa.select([target]).where(target.in_(part))
+            existing.update(row[0] for row in connection.execute(selection))
+        valid = []
+        for row in rows:
+            if row.get(name) in existing:
+                valid.append(row)
+            else:
+                report.rejected.append(
+                    (row, 'unknown {} {}'.format(name, row.get(name))))
+        rows = valid
+    return rows
+
+
+def fill_missing(table, rows):
+    '''Gives every row the same keys, as executemany and COPY require.'''
+    names = sorted(set().union(*rows))
+    defaults = {}
+    for name in names:
+        default = table.c[name].default
+        is_scalar = default is not None and default.is_scalar
+        defaults[name] = default.arg if is_scalar else None
+    return names, [{name: row.get(name, defaults[name]) for name in names}
+                   for row in rows]
+
+
+def copy_value(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        items = ('"{}"'.format(str(item).replace('\\', '\\\\')
+                                .replace('"', '\\"')) for item in value)
+        return '{' + ','.join(items) + '}'
+    return value
+
+
+def copy_field(value):
+    '''
+    Encodes one value as a COPY CSV field. COPY reads an unquoted empty
+    field as NULL and a quoted one as an empty string, so None is written
+    unquoted and every other value is quoted.
+    '''
+    value = copy_value(value)
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+
+def copy_buffer(names, rows):
+    '''Returns rows as the CSV text that COPY ... (FORMAT csv) reads.'''
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(copy_field(row[name]) for name in names))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(connection, table, names, rows):
+    '''Loads rows with PostgreSQL COPY FROM STDIN in CSV format.'''
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            table.name, ', '.join(names)),
+        copy_buffer(names, rows))
+
+
+def insert_rows(connection, table, rows):
+    names, rows = fill_missing(table, rows)
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, table, names, rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def reset_sequence(connection, table):
+    '''Moves the id sequence past ids that were imported explicitly.'''
+    if connection.dialect.name == 'postgresql':
+        connection.execute(sa.text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "coalesce(max(id), 1)) FROM {}".format(table.name)),
+            table=table.name)
+
+
+def import_records(engine, table, records, chunk_size=5000, on_chunk=None):
+    '''
+    import_records(engine, table, records, chunk_size, on_chunk)
+        streams records into table in chunks of chunk_size, each validated
+        (including foreign keys) and inserted in bulk in its own
+        transaction. on_chunk, if given, is called with the inserted rows
+        of each committed chunk. Returns an ImportReport.
+    '''
+    report = ImportReport()
+    with engine.connect() as connection:
+        for chunk in chunked(records, chunk_size):
+            rows = prepare(table, chunk, report)
+            try:
+                with connection.begin():
+                    rows = check_foreign_keys(connection, table, rows, report)
+                    if rows:
+                        insert_rows(connection, table, rows)
+            except (sa.exc.DBAPIError,
+                    connection.dialect.dbapi.Error) as error:
+                # e.g. duplicate ids or bad values: the chunk is rolled back
+                # as a whole. COPY runs on the DBAPI cursor, so its errors
+                # are the driver's own exceptions rather than SQLAlchemy's.
+                reason = 'chunk rolled back: {}'.format(
+                    getattr(error, 'orig', error))
+                report.rejected.extend((row, reason) for row in rows)
+                continue
+            report.inserted += len(rows)
+            if rows and on_chunk is not None:
+                on_chunk(rows)
+        with connection.begin():
+            reset_sequence(connection, table)
+    return report.finish()
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(engine, table, stream, format, chunk_size=5000):
+    '''
+    export_rows(engine, table, stream, format, chunk_size)
+        writes every row of table to stream as CSV or NDJSON, reading
+        through a server-side cursor so memory stays bounded. Lists are
+        written as JSON in CSV, which import_records reads back.
+        Returns the number of rows written.
+    '''
+    count = 0
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(
+            sa.select([table]).order_by(table.c.id))
+        names = list(result.keys())
+        writer = None
+        if format == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(names)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                if writer is not None:
+                    writer.writerow([csv_value(value) for value in row])
+                else:
+                    stream.write(json.dumps(dict(zip(names, row)),
+                                            default=json_default))
+                    stream.write('\n')
+            count += len(rows)
+    return count
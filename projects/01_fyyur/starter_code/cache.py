@@ -0,0 +1,256 @@
+import json
+import math
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+
+class MemoryBackend:
+    '''
+    In-process LRU cache whose entries also expire after their TTL.
+    Namespace generations are kept apart from the entries so that LRU
+    eviction can never roll a generation back.
+    '''
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def generation(self, key):
+        with self.lock:
+            return self.generations.get(key, 0)
+
+    def incr(self, key):
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            return self.generations[key]
+
+
+class RedisBackend:
+    '''
+    Speaks the Redis protocol (RESP) over a socket, so it can be served by
+    Redis or by any compatible local stand-in. Values are stored as JSON.
+    '''
+
+    name = 'redis'
+
+    def __init__(self, host='localhost', port=6379, db=0, timeout=0.5):
+        self.address = (host, port)
+        self.db = db
+        self.timeout = timeout
+        self.sock = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, self.timeout)
+        self.file = self.sock.makefile('rb')
+        if self.db:
+            self.send('SELECT', self.db)
+
+    def close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+        self.sock = None
+        self.file = None
+
+    def send(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self.sock.sendall(b''.join(parts))
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('connection closed by cache server')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise ConnectionError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise ConnectionError('unexpected reply from cache server')
+
+    def command(self, *args):
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.connect()
+                return self.send(*args)
+            except (OSError, ValueError):
+                # drop the connection so the next command reconnects
+                self.close()
+                raise
+
+    def get(self, key):
+        raw = self.command('GET', key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        args = ['SET', key, json.dumps(value)]
+        if ttl:
+            args += ['EX', max(1, math.ceil(ttl))]
+        self.command(*args)
+
+    def delete(self, keys):
+        if keys:
+            self.command('DEL', *keys)
+
+    def generation(self, key):
+        raw = self.command('GET', key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.command('INCR', key)
+
+
+class Cache:
+    '''
+    Cache for view data and rendered fragments in front of a backend.
+
+    Backend failures are counted and treated as misses, so an unreachable
+    cache server slows pages down instead of breaking them. Keys that must
+    be dropped together (such as every page of a listing) live in a
+    namespace whose generation is part of the key; bumping the generation
+    invalidates all of them at once.
+    '''
+
+    def __init__(self, backend, prefix='fyyur:'):
+        self.backend = backend
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counts = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'invalidations': 0,
+            'errors': 0
+        }
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def get(self, key):
+        try:
+            value = self.backend.get(self.prefix + key)
+        except (OSError, ValueError):
+            self.count('errors')
+            value = None
+        self.count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(self.prefix + key, value, ttl)
+            self.count('sets')
+        except (OSError, ValueError):
+            self.count('errors')
+
+    def fetch(self, key, compute, ttl=None):
+        '''Returns the cached value of key, computing and storing it on a miss.'''
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys):
+        try:
+            self.backend.delete([self.prefix + key for key in keys])
+            self.count('invalidations', len(keys))
+        except (OSError, ValueError):
+            self.count('errors')
+
+    def namespace(self, name):
+        '''Returns the key prefix of the current generation of a namespace.'''
+        try:
+            generation = self.backend.generation(self.prefix + 'gen:' + name)
+        except (OSError, ValueError):
+            self.count('errors')
+            generation = 0
+        return '{}:{}:'.format(name, generation)
+
+    def invalidate_namespace(self, name):
+        try:
+            self.backend.incr(self.prefix + 'gen:' + name)
+            self.count('invalidations')
+        except (OSError, ValueError):
+            self.count('errors')
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.counts)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        metrics['backend'] = self.backend.name
+        return metrics
+
+
+def make_cache(url):
+    '''
+    make_cache(url)
+        builds a Cache from a URL such as 'memory://?max_entries=1024'
+        or 'redis://localhost:6379/0'
+    '''
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        options = parse_qs(parsed.query)
+        max_entries = int(options.get('max_entries', ['1024'])[0])
+        return Cache(MemoryBackend(max_entries))
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.strip('/') or 0)
+        return Cache(RedisBackend(parsed.hostname or 'localhost',
+                                  parsed.port or 6379, db))
+    raise ValueError('unsupported cache URL: {}'.format(url))
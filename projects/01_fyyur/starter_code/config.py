@@ -1,4 +1,5 @@
 import os
+from db_pool import engine_options
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -13,4 +14,12 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://tdaisuke@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgres://tdaisuke@localhost:5432/fyyur')
+
+# Connection pool sized from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE and DB_POOL_PRE_PING
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+# View cache, e.g. 'memory://?max_entries=1024' or 'redis://localhost:6379/0'
+CACHE_URL = os.environ.get('CACHE_URL', 'memory://')
@@ -0,0 +1,52 @@
+import functools
+from datetime import datetime, timezone
+
+import babel.dates
+import dateutil.parser
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+@functools.lru_cache(maxsize=None)
+def compile_format(format='medium', locale=None):
+    '''
+    Resolves a named or literal Babel pattern and a locale once per
+    (format, locale) pair, so formatting only has to apply the pattern.
+    '''
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale or babel.dates.LC_TIME)
+
+
+def to_datetime(value):
+    '''Accepts a datetime, or a string as produced by str() or isoformat().'''
+    if isinstance(value, datetime):
+        date = value
+    else:
+        try:
+            date = datetime.fromisoformat(value)
+        except ValueError:
+            date = dateutil.parser.parse(value)
+    # Babel treats naive datetimes as UTC
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+@functools.lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=None):
+    '''
+    Formats a datetime or datetime string with a named ('full', 'medium') or
+    literal Babel pattern. Results are memoized, since listings render the
+    same show times over and over.
+    '''
+    pattern, locale = compile_format(format, locale)
+    return pattern.apply(to_datetime(value), locale)
+
+
+def format_datetimes(values, format='medium', locale=None):
+    '''Formats many datetimes with one pattern and locale lookup.'''
+    pattern, locale = compile_format(format, locale)
+    return [pattern.apply(to_datetime(value), locale) for value in values]
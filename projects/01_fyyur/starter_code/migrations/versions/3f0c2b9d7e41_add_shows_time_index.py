@@ -0,0 +1,24 @@
+"""add shows time index
+
+Revision ID: 3f0c2b9d7e41
+Revises: 23251d5fb1e7
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f0c2b9d7e41'
+down_revision = '23251d5fb1e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_time_id', 'shows', ['time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_time_id', table_name='shows')
@@ -0,0 +1,37 @@
+"""add num_upcoming_shows
+
+Revision ID: 8d41e6a0c5b2
+Revises: 3f0c2b9d7e41
+Create Date: 2026-10-18 11:02:47.219384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e6a0c5b2'
+down_revision = '3f0c2b9d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('num_upcoming_shows', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artists', sa.Column('num_upcoming_shows', sa.Integer(), server_default='0', nullable=False))
+    # backfill the counters from the existing shows
+    op.execute(
+        'UPDATE venues SET num_upcoming_shows = '
+        '(SELECT count(shows.id) FROM shows '
+        "WHERE shows.venue_id = venues.id AND shows.time >= timezone('utc', now()))"
+    )
+    op.execute(
+        'UPDATE artists SET num_upcoming_shows = '
+        '(SELECT count(shows.id) FROM shows '
+        "WHERE shows.artist_id = artists.id AND shows.time >= timezone('utc', now()))"
+    )
+
+
+def downgrade():
+    op.drop_column('artists', 'num_upcoming_shows')
+    op.drop_column('venues', 'num_upcoming_shows')
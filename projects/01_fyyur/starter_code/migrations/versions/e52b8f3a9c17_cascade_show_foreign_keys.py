@@ -0,0 +1,32 @@
+"""cascade show foreign keys
+
+Revision ID: e52b8f3a9c17
+Revises: c7a93e1f04d8
+Create Date: 2026-10-18 14:05:51.588023
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e52b8f3a9c17'
+down_revision = 'c7a93e1f04d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the original constraints were created unnamed, so they carry
+    # PostgreSQL's default <table>_<column>_fkey names
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'])
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'])
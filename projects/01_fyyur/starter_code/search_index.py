@@ -0,0 +1,77 @@
+import threading
+from collections import defaultdict
+
+
+class NgramIndex:
+    '''
+    In-memory n-gram index for case-insensitive substring search.
+
+    Used where PostgreSQL's pg_trgm is not available (e.g. SQLite test
+    runs). Candidates are found by intersecting the posting sets of the
+    term's n-grams, then confirmed with a substring check and ranked by
+    n-gram similarity to the term. The index is shared by request
+    threads, so every read and write holds its lock.
+    '''
+
+    def __init__(self, n=3):
+        self.n = n
+        self.lock = threading.Lock()
+        self.texts = {}
+        self.postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, key, text):
+        text = (text or '').lower()
+        with self.lock:
+            self.remove_locked(key)
+            self.texts[key] = text
+            for gram in self.grams(text):
+                self.postings[gram].add(key)
+
+    def remove(self, key):
+        with self.lock:
+            self.remove_locked(key)
+
+    def remove_locked(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self.grams(text):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def similarity(self, term_grams, key):
+        text_grams = self.grams(self.texts[key])
+        union = term_grams | text_grams
+        if not union:
+            return 0.0
+        return len(term_grams & text_grams) / len(union)
+
+    def search(self, term):
+        '''Returns the keys whose text contains term, best matches first.'''
+        term = term.lower()
+        term_grams = self.grams(term)
+        with self.lock:
+            if term_grams:
+                postings = sorted((self.postings.get(gram, set())
+                                   for gram in term_grams), key=len)
+                candidates = set(postings[0])
+                for keys in postings[1:]:
+                    candidates &= keys
+                    if not candidates:
+                        break
+            else:
+                # terms shorter than n have no grams to look up
+                candidates = self.texts.keys()
+
+            matches = [key for key in candidates if term in self.texts[key]]
+            scores = {key: self.similarity(term_grams, key) for key in matches}
+        matches.sort(key=lambda key: (-scores[key], key))
+        return matches
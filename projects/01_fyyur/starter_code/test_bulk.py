@@ -0,0 +1,86 @@
+import io
+import unittest
+from datetime import datetime
+
+import sqlalchemy as sa
+
+import bulk
+
+
+class BulkTestCase(unittest.TestCase):
+    """Tests of the COPY encoder and chunked imports of bulk.py"""
+
+    def setUp(self):
+        metadata = sa.MetaData()
+        self.table = sa.Table(
+            'venue', metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('name', sa.String, nullable=False),
+            sa.Column('phone', sa.String))
+        self.engine = sa.create_engine('sqlite://')
+        metadata.create_all(self.engine)
+
+    def test_copy_buffer_writes_none_as_unquoted_empty_field(self):
+        names = ['phone', 'id', 'name', 'seeking_talent', 'genres']
+        rows = [{'phone': None, 'id': 1, 'name': 'A',
+                 'seeking_talent': None, 'genres': None}]
+
+        self.assertEqual(bulk.copy_buffer(names, rows).getvalue(),
+                         ',1,"A",,\n')
+
+    def test_copy_buffer_quotes_empty_strings_and_values(self):
+        names = ['name', 'phone', 'seeking_talent', 'genres', 'start_time']
+        rows = [{'name': 'The "Hop"', 'phone': '',
+                 'seeking_talent': False, 'genres': ['Jazz', 'R&B'],
+                 'start_time': datetime(2035, 4, 1, 20, 0)}]
+
+        self.assertEqual(
+            bulk.copy_buffer(names, rows).getvalue(),
+            '"The ""Hop""","","f","{""Jazz"",""R&B""}",'
+            '"2035-04-01T20:00:00"\n')
+
+    def test_failed_chunk_is_reported_and_import_continues(self):
+        records = [{'id': 1, 'name': 'A'}, {'id': 1, 'name': 'B'},
+                   {'id': 2, 'name': 'C'}]
+
+        report = bulk.import_records(self.engine, self.table, records,
+                                     chunk_size=2)
+
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual(len(report.rejected), 2)
+        self.assertTrue(report.rejected[0][1].startswith('chunk rolled back'))
+
+    def test_malformed_ndjson_lines_are_rejected(self):
+        stream = io.StringIO('{"id": 1, "name": "A"}\n{bad json\n'
+                             '[1, 2]\n\n{"id": 2, "name": "B"}\n')
+        records = bulk.read_records(stream, 'ndjson')
+
+        report = bulk.import_records(self.engine, self.table, records,
+                                     chunk_size=2)
+
+        self.assertEqual(report.inserted, 2)
+        self.assertEqual([record for record, _ in report.rejected],
+                         ['{bad json', [1, 2]])
+        self.assertTrue(report.rejected[0][1].startswith('invalid JSON'))
+        self.assertEqual(report.rejected[1][1], 'not an object')
+
+    def test_bad_array_values_are_rejected(self):
+        table = sa.Table(
+            'artist', sa.MetaData(),
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('genres', sa.ARRAY(sa.String)))
+        records = [{'genres': 5}, {'genres': {'a': 1}}, {'genres': '[Jazz'},
+                   {'genres': 'Jazz;Folk'}, {'genres': '["Rock"]'}]
+        report = bulk.ImportReport()
+
+        rows = bulk.prepare(table, records, report)
+
+        self.assertEqual(rows, [{'genres': ['Jazz', 'Folk']},
+                                {'genres': ['Rock']}])
+        self.assertEqual([record for record, _ in report.rejected],
+                         records[:3])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
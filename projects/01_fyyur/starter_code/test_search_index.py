@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+from search_index import NgramIndex
+
+
+class NgramIndexTestCase(unittest.TestCase):
+    """Tests of the in-memory name index used without pg_trgm"""
+
+    def setUp(self):
+        self.index = NgramIndex()
+        self.index.add(1, 'The Musical Hop')
+        self.index.add(2, 'Park Square Live Music & Coffee')
+        self.index.add(3, 'The Dueling Pianos Bar')
+
+    def test_search_is_case_insensitive_substring_match(self):
+        self.assertEqual(self.index.search('MUSIC'), [1, 2])
+        self.assertEqual(self.index.search('piano'), [3])
+        self.assertEqual(self.index.search('jazz'), [])
+
+    def test_search_ranks_closer_names_first(self):
+        self.index.add(4, 'Hop')
+
+        self.assertEqual(self.index.search('hop'), [4, 1])
+
+    def test_terms_shorter_than_n_scan_all_texts(self):
+        self.assertEqual(self.index.search('ba'), [3])
+        self.assertEqual(self.index.search(''), [1, 2, 3])
+
+    def test_add_replaces_the_text_of_a_key(self):
+        self.index.add(1, 'Blue Note')
+
+        self.assertEqual(self.index.search('musical'), [])
+        self.assertEqual(self.index.search('blue'), [1])
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove_drops_key_and_empty_postings(self):
+        self.index.remove(3)
+        self.index.remove(3)
+
+        self.assertEqual(self.index.search('piano'), [])
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn('pia', self.index.postings)
+
+    def test_none_text_is_indexed_as_empty(self):
+        self.index.add(5, None)
+
+        self.assertEqual(self.index.search('hop'), [1])
+        self.assertIn(5, self.index.search(''))
+
+    def test_concurrent_writes_and_searches(self):
+        errors = []
+
+        def write(offset):
+            for key in range(offset, offset + 500):
+                self.index.add(key, 'Venue {}'.format(key))
+                self.index.remove(key)
+
+        def search():
+            try:
+                for _ in range(500):
+                    self.index.search('ve')
+                    self.index.search('venue')
+            except RuntimeError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(offset,))
+                   for offset in (100, 1000)]
+        threads += [threading.Thread(target=search) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.index), 3)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
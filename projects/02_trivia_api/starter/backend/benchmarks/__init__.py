@@ -0,0 +1 @@
+'''Benchmarks for the trivia API; see README.md for how to run them.'''
@@ -0,0 +1,176 @@
+'''
+Times every endpoint of the API against generated banks of 1k, 100k and
+1M questions, reporting the median and fastest request and the queries
+each one runs. --save writes the medians to a JSON file; --compare exits
+with status 1 when an endpoint is slower than a saved run by more than
+--tolerance, or runs more queries than it did.
+
+    $ python -m benchmarks.endpoints --save baseline.json
+    $ python -m benchmarks.endpoints --compare baseline.json
+    $ python -m benchmarks.endpoints --sizes 1000 --only quiz
+'''
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.fixtures import app, count_queries, db, print_table, seed
+from models import Question
+
+BULK_ROWS = 100
+
+
+def check(response):
+    if response.status_code >= 400:
+        raise AssertionError('{}: {}'.format(
+            response.status_code, response.get_data(as_text=True)[:200]))
+    return response
+
+
+def endpoint_cases(client, size):
+    '''(name, func) pairs issuing the requests of one benchmark each.'''
+    middle = size // 2
+    last_page = max(size // 10, 1)
+    etag = check(client.get('/categories')).headers['ETag']
+    new_question = {'question': 'Which benchmark wrote this question?',
+                    'answer': 'endpoints', 'category': '1', 'difficulty': 1}
+    bulk = '\n'.join(
+        json.dumps({'question': 'Bulk benchmark question {}?'.format(i),
+                    'answer': 'endpoints bulk', 'category': 1,
+                    'difficulty': 1})
+        for i in range(BULK_ROWS))
+
+    def get(url, **kwargs):
+        return lambda: check(client.get(url, **kwargs))
+
+    def post(url, body):
+        return lambda: check(client.post(url, json=body))
+
+    def create_and_delete(headers):
+        def run():
+            created = check(client.post(
+                '/questions', json=new_question,
+                headers=headers)).get_json()['created']
+            check(client.delete('/questions/{}'.format(created),
+                                headers=headers))
+        return run
+
+    def ingest_and_delete():
+        check(client.post('/questions/bulk', data=bulk,
+                          content_type='application/x-ndjson'))
+        Question.query.filter(Question.answer == 'endpoints bulk').\
+            delete(synchronize_session=False)
+        db.session.commit()
+
+    def quiz_session():
+        session_id = check(client.post(
+            '/quizzes/sessions',
+            json={'quiz_category': {'id': 1, 'type': 'Science'}}
+        )).get_json()['session_id']
+        for _ in range(5):
+            check(client.post(
+                '/quizzes/sessions/{}/questions'.format(session_id)))
+        check(client.delete('/quizzes/sessions/{}'.format(session_id)))
+
+    return [
+        ('categories', get('/categories')),
+        ('categories 304', get('/categories',
+                               headers={'If-None-Match': etag})),
+        ('questions', get('/questions')),
+        ('questions last page', get('/questions?page={}'.format(last_page))),
+        ('questions after_id', get('/questions?after_id={}'.format(middle))),
+        ('questions columnar 1000',
+         get('/questions?format=columnar&per_page=1000')),
+        ('category questions', get('/categories/1/questions')),
+        ('search', post('/questions', {'searchTerm': 'river capital'})),
+        ('create + delete', create_and_delete({})),
+        ('create + delete minimal',
+         create_and_delete({'Prefer': 'return=minimal'})),
+        ('bulk {} + delete'.format(BULK_ROWS), ingest_and_delete),
+        ('quiz', post('/quizzes', {
+            'previous_questions': list(range(1, min(size, 100) + 1)),
+            'quiz_category': {'id': 0, 'type': 'click'}})),
+        ('quiz session of 5', quiz_session),
+        ('answer', post('/questions/{}/answers'.format(middle or 1),
+                        {'correct': False})),
+        ('hardest', get('/categories/1/questions/hardest?min_answers=1')),
+        ('pool metrics', get('/pool/metrics')),
+    ]
+
+
+def run_case(func, repeat):
+    '''Returns (median ms, fastest ms, queries of one run).'''
+    func()  # warm caches shared between requests
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        with count_queries() as counter:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[0], counter[0]
+
+
+def regressions(results, baseline, tolerance):
+    '''Messages for the results slower or chattier than the baseline.'''
+    messages = []
+    for key, result in results.items():
+        saved = baseline.get(key)
+        if saved is None:
+            continue
+        if result['median_ms'] > saved['median_ms'] * (1 + tolerance):
+            messages.append('{}: {:.2f} ms, was {:.2f} ms'.format(
+                key, result['median_ms'], saved['median_ms']))
+        if result['queries'] > saved['queries']:
+            messages.append('{}: {} queries, was {}'.format(
+                key, result['queries'], saved['queries']))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', default=[],
+                        help='run the endpoints whose name contains one of '
+                             'these words')
+    parser.add_argument('--save', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown over the baseline, as a '
+                             'fraction (default 0.25)')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    results = {}
+    rows = []
+    for size in args.sizes:
+        with app.app_context():
+            seed(size)
+            for name, func in endpoint_cases(client, size):
+                if args.only and not any(word in name for word in args.only):
+                    continue
+                median, fastest, queries = run_case(func, args.repeat)
+                results['{} @ {}'.format(name, size)] = {
+                    'median_ms': round(median, 3), 'queries': queries}
+                rows.append([size, name, queries, '{:.2f}'.format(median),
+                             '{:.2f}'.format(fastest)])
+
+    print_table(['questions', 'endpoint', 'queries', 'median ms',
+                 'fastest ms'], rows)
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as saved:
+            messages = regressions(results, json.load(saved), args.tolerance)
+        for message in messages:
+            print('regression: ' + message, file=sys.stderr)
+        if messages:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Database fixtures for the trivia benchmarks.
+
+Like the tests, the benchmarks run against TEST_DATABASE_URL when it is
+set and otherwise against a temporary SQLite database. Seeding replaces
+the questions and categories, so TEST_DATABASE_URL must point at a
+scratch database. DATABASE_URL, the app's own database, is never used.
+'''
+import atexit
+import statistics
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from flaskr import create_app
+from models import db
+import harness
+
+database = harness.TemporaryDatabase()
+atexit.register(database.close)
+app = create_app({'SQLALCHEMY_DATABASE_URI': database.url})
+
+
+@contextmanager
+def count_queries():
+    '''Yields a one-item list holding the number of statements executed.'''
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+
+def measure(func, repeat=5):
+    '''Runs func repeatedly and returns (median seconds, queries per call).'''
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        with count_queries() as counter:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), counter[0]
+
+
+def seed(num_questions, seed_value=0):
+    '''Replaces the tables with the six categories and num_questions questions.'''
+    harness.seed(app, num_questions, seed_value)
+
+
+def print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column)
+              for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width)
+                        for cell, width in zip(row, widths)))
@@ -0,0 +1,62 @@
+'''
+Compares the question listing before and after pagination moved into SQL:
+the first page, a deep page by OFFSET and the same page by after_id.
+
+    $ python -m benchmarks.pagination --questions 1000000
+'''
+import argparse
+
+from benchmarks.fixtures import app, measure, print_table, seed
+from flaskr import QUESTIONS_PER_PAGE
+from models import Question
+
+
+def legacy_page(page):
+    '''The listing before this change: format every question, then slice.'''
+    selection = Question.query.order_by(Question.id).all()
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    questions = [question.format() for question in selection]
+    return questions[start:start + QUESTIONS_PER_PAGE], len(selection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy-repeat', type=int, default=1,
+                        help='runs of the legacy listing, which reads the '
+                             'whole table each time')
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.questions)
+    client = app.test_client()
+    deep_page = args.questions // QUESTIONS_PER_PAGE // 2
+    deep_after_id = (deep_page - 1) * QUESTIONS_PER_PAGE
+
+    rows = []
+    for label, path in (
+            ('page 1', '/questions?page=1'),
+            ('page {}'.format(deep_page),
+             '/questions?page={}'.format(deep_page)),
+            ('after_id {}'.format(deep_after_id),
+             '/questions?after_id={}'.format(deep_after_id))):
+        with app.app_context():
+            seconds, queries = measure(lambda: client.get(path), args.repeat)
+        rows.append(['sql', label, queries, '{:.2f}'.format(seconds * 1000)])
+
+    for label, page in (('page 1', 1), ('page {}'.format(deep_page),
+                                        deep_page)):
+        with app.app_context():
+            seconds, queries = measure(lambda: legacy_page(page),
+                                       args.legacy_repeat)
+        rows.append(['legacy', label, queries,
+                     '{:.2f}'.format(seconds * 1000)])
+
+    print('{} questions, {} per page'.format(args.questions,
+                                             QUESTIONS_PER_PAGE))
+    print_table(['listing', 'request', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Times POST /quizzes against the previous implementation, which loaded and
+formatted the whole bank, for a growing number of previous questions.
+
+    $ python -m benchmarks.quiz --questions 1000000 --previous 0 1000 100000
+'''
+import argparse
+import random
+
+from benchmarks.fixtures import app, measure, print_table, seed
+from models import Question
+
+
+def legacy_next_question(previous_questions):
+    '''The /quizzes handler before this change, for all categories.'''
+    questions = [question.format() for question in Question.query.all()]
+    if len(questions) == len(set(previous_questions)):
+        return False
+    selection_without_previous = []
+    for question in questions:
+        if question['id'] in previous_questions:
+            continue
+        selection_without_previous.append(question)
+    return random.choice(selection_without_previous)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--previous', type=int, nargs='+',
+                        default=[0, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy', action='store_true',
+                        help='also time the previous handler, which reads '
+                             'the whole table on every call')
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.questions)
+    client = app.test_client()
+    rng = random.Random(0)
+
+    rows = []
+    for previous in args.previous:
+        previous_questions = rng.sample(range(1, args.questions + 1),
+                                        min(previous, args.questions))
+        body = {'previous_questions': previous_questions,
+                'quiz_category': {'id': 0, 'type': 'click'}}
+        with app.app_context():
+            client.post('/quizzes', json=body)  # warm the id cache
+            seconds, queries = measure(
+                lambda: client.post('/quizzes', json=body), args.repeat)
+        rows.append(['sampled', previous, queries,
+                     '{:.2f}'.format(seconds * 1000)])
+        if args.legacy:
+            with app.app_context():
+                seconds, queries = measure(
+                    lambda: legacy_next_question(previous_questions), 1)
+            rows.append(['legacy', previous, queries,
+                         '{:.2f}'.format(seconds * 1000)])
+
+    print('{} questions'.format(args.questions))
+    print_table(['handler', 'previous', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Times question search against the previous ILIKE scan for common, rare,
+multi-word and prefix terms. On PostgreSQL the tsvector GIN index is
+used; on other databases the in-memory index, whose build is timed
+separately.
+
+    $ python -m benchmarks.search --questions 100000
+'''
+import argparse
+import time
+
+from benchmarks.fixtures import app, db, measure, print_table, seed
+from flaskr import QUESTIONS_PER_PAGE
+from models import Question
+from search import memory_index, search_questions
+
+TERMS = ['river', 'capital city', 'won world cup', 'disc']
+
+
+def legacy_search(term):
+    '''The search branch before this change, which only read questions.'''
+    questions = Question.query.\
+        filter(Question.question.ilike('%{}%'.format(term))).\
+        order_by(Question.id)
+    page = [question.format()
+            for question in questions.limit(QUESTIONS_PER_PAGE)]
+    return page, questions.order_by(None).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.questions)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute('ANALYZE questions')
+            engine = 'tsvector'
+        else:
+            memory_index.reset()
+            start = time.perf_counter()
+            memory_index.build()
+            engine = 'memory index, built in {:.0f} ms'.format(
+                (time.perf_counter() - start) * 1000)
+
+        rows = []
+        for term in TERMS:
+            def search():
+                questions, total = search_questions(
+                    term, offset=0, limit=QUESTIONS_PER_PAGE)
+                return [question.format() for question in questions], total
+
+            seconds, queries = measure(search, args.repeat)
+            total = search()[1]
+            legacy_seconds, _ = measure(lambda: legacy_search(term),
+                                        args.repeat)
+            rows.append([term, total, legacy_search(term)[1], queries,
+                         '{:.2f}'.format(seconds * 1000),
+                         '{:.2f}'.format(legacy_seconds * 1000)])
+
+    print('{} questions, {}'.format(args.questions, engine))
+    print_table(['term', 'matches', 'ilike matches', 'queries', 'ms',
+                 'ilike ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+'''
+Builds the JSON body of a large page of questions through ORM objects
+and Question.format() with jsonify, and through row tuples with the
+serialization module, as records and as columns. Reports rows per
+second, the memory blocks each response leaves allocated and the peak
+memory while building it.
+
+    $ python -m benchmarks.serialization --questions 100000 --page 1000
+'''
+import argparse
+import time
+import tracemalloc
+
+from flask import jsonify
+
+from benchmarks.fixtures import app, print_table, seed
+from models import Question
+import serialization
+
+
+def allocations(func):
+    '''
+    Returns the memory blocks still allocated when func returns (its
+    response and anything it cached) and the peak KiB traced meanwhile.
+    '''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    return blocks, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--page', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.questions)
+
+    def selection():
+        return Question.query.order_by(Question.id).limit(args.page)
+
+    def orm_jsonify():
+        questions = [question.format() for question in selection()]
+        return jsonify({'success': True, 'questions': questions}).data
+
+    def rows_records():
+        rows = serialization.question_rows(selection())
+        return serialization.dumps({'success': True,
+                                    'questions': serialization.records(rows)})
+
+    def rows_columns():
+        rows = serialization.question_rows(selection())
+        payload = serialization.columns(rows)
+        payload['success'] = True
+        return serialization.dumps(payload)
+
+    encoder = 'orjson' if serialization.orjson is not None else 'json'
+    rows = []
+    for label, func in (('orm + format + jsonify', orm_jsonify),
+                        ('rows + records + ' + encoder, rows_records),
+                        ('rows + columns + ' + encoder, rows_columns)):
+        with app.test_request_context():
+            func()
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                size = len(func())
+            seconds = (time.perf_counter() - start) / args.repeat
+            blocks, peak = allocations(func)
+            # the ORM path keeps instances in the session between responses
+            Question.query.session.expunge_all()
+        rows.append([label, '{:,.0f}'.format(args.page / seconds),
+                     '{:.2f}'.format(seconds * 1000), blocks,
+                     '{:.0f}'.format(peak), size])
+
+    print('{} questions per response'.format(args.page))
+    print_table(['path', 'rows/s', 'ms', 'live blocks', 'peak KiB',
+                 'bytes'], rows)
+
+
+if __name__ == '__main__':
+    main()
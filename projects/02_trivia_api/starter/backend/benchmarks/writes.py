@@ -0,0 +1,77 @@
+'''
+Times question creation and deletion with the full response (a page of
+questions and the categories) and with Prefer: return=minimal, as the
+table grows. --legacy adds the response as it was built before
+pagination moved into SQL, reading and formatting the whole table.
+
+    $ python -m benchmarks.writes --sizes 1000 100000 1000000
+'''
+import argparse
+
+from benchmarks.fixtures import app, measure, print_table, seed
+from models import Question, category_cache
+
+NEW_QUESTION = {
+    'question': 'Which benchmark wrote this question?',
+    'answer': 'writes',
+    'category': '1',
+    'difficulty': 1
+}
+MINIMAL = {'Prefer': 'return=minimal'}
+
+
+def create_and_delete(client, headers):
+    created = client.post('/questions', json=NEW_QUESTION,
+                          headers=headers).get_json()['created']
+    client.delete('/questions/{}'.format(created), headers=headers)
+
+
+def legacy_listing():
+    '''What every write used to add to its response.'''
+    selection = Question.query.order_by(Question.id).all()
+    questions = [question.format() for question in selection][:10]
+    category_cache.invalidate()
+    category_cache.get()
+    return questions, len(selection)
+
+
+def legacy_create_and_delete(client):
+    create_and_delete(client, MINIMAL)
+    legacy_listing()
+    legacy_listing()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rows = []
+    for size in args.sizes:
+        with app.app_context():
+            seed(size)
+        for label, headers in (('full', {}), ('minimal', MINIMAL)):
+            with app.app_context():
+                # the first write fills the cached count
+                create_and_delete(client, headers)
+                seconds, queries = measure(
+                    lambda: create_and_delete(client, headers), args.repeat)
+            rows.append([size, label, queries,
+                         '{:.2f}'.format(seconds * 1000)])
+        if args.legacy:
+            with app.app_context():
+                seconds, queries = measure(
+                    lambda: legacy_create_and_delete(client), 3)
+            rows.append([size, 'legacy', queries,
+                         '{:.2f}'.format(seconds * 1000)])
+
+    print('one create and one delete per run')
+    print_table(['questions', 'response', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,49 +1,178 @@
+import io
 import os
 import sys
-from flask import Flask, request, abort, jsonify
+import click
+from flask import Flask, request, abort, jsonify, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import time
 
-from models import setup_db, Question, Category
+from models import db, setup_db, database_path, Question, category_cache
+from session_store import make_store
+from search import search_questions
+from serialization import question_rows, records, columns, json_response
+import ingest
+import quiz
+from db_pool import pool_status
+from stats import StatsRecorder, ranked_questions, MIN_ANSWERS
 
 
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 1000
+QUESTION_COUNT_TTL = 60
+QUIZ_SESSION_TTL = 3600
+STATS_FLUSH_INTERVAL = 10
+STATS_FLUSH_SIZE = 1000
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(*args):
+    # per-request statement count, reported in X-Query-Count when enabled
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    app.config['QUERY_COUNT_HEADER'] = \
+        os.environ.get('QUERY_COUNT_HEADER', '') == 'true'
+    # e.g. 'memory://?max_sessions=100000' or 'redis://localhost:6379/0'
+    app.config['QUIZ_STORE_URL'] = \
+        os.environ.get('QUIZ_STORE_URL', 'memory://')
+    app.config['QUIZ_SESSION_TTL'] = int(
+        os.environ.get('QUIZ_SESSION_TTL', QUIZ_SESSION_TTL))
+    # seconds between, and questions per, question stats flushes
+    app.config['STATS_FLUSH_INTERVAL'] = float(
+        os.environ.get('STATS_FLUSH_INTERVAL', STATS_FLUSH_INTERVAL))
+    app.config['STATS_FLUSH_SIZE'] = int(
+        os.environ.get('STATS_FLUSH_SIZE', STATS_FLUSH_SIZE))
+    if test_config is not None:
+        app.config.update(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    quiz_store = make_store(app.config['QUIZ_STORE_URL'])
+    question_stats = StatsRecorder(app, app.config['STATS_FLUSH_INTERVAL'],
+                                   app.config['STATS_FLUSH_SIZE'])
+    app.extensions['question_stats'] = question_stats
 
     # Set up CORS. Allow '*' for origins.
     cors = CORS(app, resource={r'*': '*'})
 
+    # cached question counts by category id (None for all questions)
+    question_counts = {}
+    app.extensions['question_counts'] = question_counts
+
     def paginate_questions(request, selection):
-        page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
+        '''
+        Fetches one page of selection, a query ordered by Question.id,
+        either after the question id given as after_id or at page, as
+        row tuples in the order of serialization.FIELDS. per_page
+        (up to MAX_QUESTIONS_PER_PAGE) overrides the page size.
+        '''
+        per_page = request.args.get('per_page', QUESTIONS_PER_PAGE, type=int)
+        if not 1 <= per_page <= MAX_QUESTIONS_PER_PAGE:
+            return []
+        after_id = request.args.get('after_id', None, type=int)
+        if after_id is not None:
+            selection = selection.filter(Question.id > after_id)
+        else:
+            page = request.args.get('page', 1, type=int)
+            if page < 1:
+                return []
+            selection = selection.offset((page - 1) * per_page)
+
+        return question_rows(selection.limit(per_page))
+
+    def questions_payload(request, rows):
+        '''
+        The questions of a listing: a list of question objects, or with
+        format=columnar one list per field (ids, questions, answers,
+        category_ids and difficulties).
+        '''
+        if request.args.get('format') == 'columnar':
+            return columns(rows)
+
+        return {'questions': records(rows)}
+
+    def count_questions(category_id=None):
+        '''
+        Counts all questions, or those of a category, caching the count for
+        QUESTION_COUNT_TTL seconds. Creating or deleting a question adjusts
+        the counts of this process; the TTL bounds how stale other
+        processes can be.
+        '''
+        cached = question_counts.get(category_id)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        selection = Question.query
+        if category_id is not None:
+            selection = selection.filter(Question.category == category_id)
+        count = selection.count()
+        question_counts[category_id] = (now + QUESTION_COUNT_TTL, count)
+
+        return count
+
+    def category_by_id(category_id):
+        categories = response_categories()
+        if category_id not in categories:
+            abort(404)
 
-        questions = [question.format() for question in selection]
-        current_questions = questions[start: end]
+        return {'id': category_id, 'type': categories[category_id]}
+
+    def adjust_question_counts(category, delta):
+        '''Applies a created (+1) or deleted (-1) question to cached counts.'''
+        keys = [None]
+        if str(category).isdigit():
+            keys.append(int(category))
+        for key in keys:
+            cached = question_counts.get(key)
+            if cached is not None:
+                question_counts[key] = (cached[0], cached[1] + delta)
+
+    def minimal_response(request):
+        '''
+        True when the client asked a write to answer with the affected id
+        and total_questions only, by ?response=minimal or by the header
+        Prefer: return=minimal.
+        '''
+        return request.args.get('response') == 'minimal' or \
+            'return=minimal' in request.headers.get('Prefer', '')
+
+    def write_response(request, key, question_id):
+        if minimal_response(request):
+            response = jsonify({
+                'success': True,
+                key: question_id,
+                'total_questions': count_questions()
+            })
+            if 'return=minimal' in request.headers.get('Prefer', ''):
+                response.headers['Preference-Applied'] = 'return=minimal'
+            return response
 
-        return current_questions
+        questions = Question.query.order_by(Question.id)
+        current_questions = paginate_questions(request, questions)
+
+        return jsonify({
+            'success': True,
+            key: question_id,
+            'questions': records(current_questions),
+            'total_questions': count_questions(),
+            'current_category': current_category(request),
+            'categories': response_categories()
+        })
 
     def current_category(request):
         category_id = request.args.get('category', 1, type=int)
-        selection = Category.query.get(category_id)
-        category = selection.format()
 
-        return category
+        return category_by_id(category_id)
 
     def response_categories():
-        selection = Category.query.all()
-        categories = [category.format() for category in selection]
-        response = {}
-        for category in categories:
-            response[category['id']] = category['type']
-
-        return response
+        # shared by all requests; callers must not modify it
+        return category_cache.get()['types']
 
     # CORS Headers
     @app.after_request
@@ -56,40 +185,46 @@ def create_app(test_config=None):
             'Access-Control-Allow-Methos',
             'GET, POST, PATCH, DELETE, OPTIONS'
             )
+        if app.config['QUERY_COUNT_HEADER']:
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
         return response
 
     @app.route('/categories')
     def retrieve_categories():
-        selection = Category.query.all()
-        categories = response_categories()
+        snapshot = category_cache.get()
+        categories = snapshot['types']
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'categories': categories,
             'total_categories': len(categories)
         })
+        response.set_etag(snapshot['etag'])
+
+        return response.make_conditional(request)
 
     @app.route('/questions')
     def retrieve_questions():
-        questions = Question.query.order_by(Question.id).all()
+        questions = Question.query.order_by(Question.id)
         current_questions = paginate_questions(request, questions)
 
         if len(current_questions) == 0:
             abort(404)
 
         else:
-            selection = Category.query.order_by(Category.id).all()
             categories = response_categories()
             category = current_category(request)
 
-            return jsonify({
+            payload = questions_payload(request, current_questions)
+            payload.update({
                 'success': True,
-                'questions': current_questions,
-                'total_questions': len(questions),
+                'total_questions': count_questions(),
                 'current_category': category,
                 'categories': categories
             })
 
+            return json_response(payload)
+
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
         try:
@@ -97,23 +232,11 @@ def create_app(test_config=None):
             if question is None:
                 abort(422)
 
+            category = question.category
             question.delete()
+            adjust_question_counts(category, -1)
 
-            questions = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, questions)
-
-            selection = Category.query.order_by(Category.id).all()
-            categories = response_categories()
-            category = current_category(request)
-
-            return jsonify({
-                'success': True,
-                'deleted': question_id,
-                'questions': current_questions,
-                'total_questions': len(questions),
-                'current_category': category,
-                'categories': categories
-            })
+            return write_response(request, 'deleted', question_id)
         except:
             print(sys.exc_info())
             abort(422)
@@ -124,19 +247,26 @@ def create_app(test_config=None):
             body = request.get_json()
             search = body.get('searchTerm', None)
             if search:
-                questions = Question.query.\
-                    filter(Question.question.ilike('%{}%'.format(search))).\
-                    order_by(Question.id).all()
-                current_questions = paginate_questions(request, questions)
+                # ranked results page by offset only; after_id does not apply
+                page = request.args.get('page', 1, type=int)
+                if page < 1:
+                    abort(404)
+                questions, total_questions = search_questions(
+                    search,
+                    body.get('category'),
+                    (page - 1) * QUESTIONS_PER_PAGE,
+                    QUESTIONS_PER_PAGE
+                )
+                current_questions = [question.format()
+                                     for question in questions]
 
-                selection = Category.query.order_by(Category.id).all()
                 categories = response_categories()
                 category = current_category(request)
 
                 return jsonify({
                     'success': True,
                     'questions': current_questions,
-                    'total_questions': len(questions),
+                    'total_questions': total_questions,
                     'current_category': category,
                     'categories': categories
                 })
@@ -151,23 +281,10 @@ def create_app(test_config=None):
                     category=new_category,
                     difficulty=new_difficulty
                 )
-                question.insert()
-
-                questions = Question.query.order_by(Question.id).all()
-                current_questions = paginate_questions(request, questions)
+                question_id = question.insert()
+                adjust_question_counts(new_category, 1)
 
-                selection = Category.query.order_by(Category.id).all()
-                categories = response_categories()
-                category = current_category(request)
-
-                return jsonify({
-                    'success': True,
-                    'created': question.id,
-                    'questions': current_questions,
-                    'total_questions': len(questions),
-                    'current_category': category,
-                    'categories': categories
-                })
+                return write_response(request, 'created', question_id)
         except:
             print(sys.exc_info())
             abort(422)
@@ -175,53 +292,191 @@ def create_app(test_config=None):
     @app.route('/categories/<int:category_id>/questions')
     def retrieve_questions_by_category(category_id):
         questions = Question.query.filter(Question.category == category_id).\
-            order_by(Question.id).all()
+            order_by(Question.id)
         current_questions = paginate_questions(request, questions)
 
         if len(current_questions) == 0:
             abort(404)
         else:
-            selection = Category.query.order_by(Category.id).all()
             categories = response_categories()
-            category = Category.query.get(category_id).format()
+            category = category_by_id(category_id)
 
-            return jsonify({
+            payload = questions_payload(request, current_questions)
+            payload.update({
                 'success': True,
-                'questions': current_questions,
-                'total_questions': len(questions),
+                'total_questions': count_questions(category_id),
                 'current_category': category,
                 'categories': categories
             })
 
+            return json_response(payload)
+
     @app.route('/quizzes', methods=['POST'])
     def get_next_question():
         body = request.get_json()
         previous_questions = body.get('previous_questions', [])
         category = body.get('quiz_category', {'id': 0, 'type': 'click'})
 
-        if category['id'] == 0:
-            selection = Question.query.all()
-        else:
-            selection = Question.query.\
-                filter(Question.category == category['id']).all()
+        question = quiz.next_question(category['id'], set(previous_questions))
+        current_question = question.format() if question else False
+        if question:
+            question_stats.served(question.id)
 
-        questions = [question.format() for question in selection]
-        if len(questions) == len(set(previous_questions)):
-            current_question = False
+        return jsonify({
+            'success': True,
+            'question': current_question,
+            'current_category': category,
+        })
+
+    @app.route('/questions/bulk', methods=['POST'])
+    def ingest_questions():
+        # NDJSON (one question object per line) or CSV with a header row
+        if request.mimetype == 'text/csv':
+            format = 'csv'
+        elif request.mimetype in ('application/x-ndjson',
+                                  'application/json'):
+            format = 'ndjson'
         else:
-            selection_without_previous = []
-            for question in questions:
-                if question['id'] in previous_questions:
-                    continue
-                else:
-                    selection_without_previous.append(question)
+            abort(422)
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8',
+                                  newline='')
+        report = ingest.ingest(ingest.read_records(stream, format))
+        question_counts.clear()
+
+        response = report.format()
+        response['success'] = True
+
+        return jsonify(response)
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['ndjson', 'csv']),
+                  help='defaults to csv for .csv files, ndjson otherwise')
+    @click.option('--chunk-size', default=ingest.INGEST_CHUNK,
+                  show_default=True)
+    def import_questions(path, format, chunk_size):
+        '''Loads questions from an NDJSON or CSV file.'''
+        if format is None:
+            format = 'csv' if path.endswith('.csv') else 'ndjson'
+
+        def progress(report):
+            click.echo('{} inserted, {} rejected'.format(
+                report.inserted, len(report.rejected)), err=True)
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            report = ingest.ingest(ingest.read_records(stream, format),
+                                   chunk_size, progress)
+        for line_number, reason in report.rejected:
+            click.echo('line {}: {}'.format(line_number, reason), err=True)
+        click.echo('{} questions inserted, {} rejected in {:.1f}s '
+                   '({:.0f} rows/s)'.format(
+                       report.inserted, len(report.rejected),
+                       report.seconds, report.rows_per_second))
+
+    def quiz_category(category_id):
+        if category_id == 0:
+            return {'id': 0, 'type': 'click'}
+
+        return category_by_id(category_id)
+
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def create_quiz_session():
+        body = request.get_json() or {}
+        category = body.get('quiz_category', {'id': 0, 'type': 'click'})
+        category_id = category.get('id', 0)
+        if not isinstance(category_id, int):
+            abort(422)
+        current_category = quiz_category(category_id)
 
-            current_question = random.choice(selection_without_previous)
+        try:
+            session_id = quiz.start_session(
+                quiz_store, category_id, app.config['QUIZ_SESSION_TTL'])
+        except OSError:
+            print(sys.exc_info())
+            abort(503)
 
         return jsonify({
             'success': True,
-            'question': current_question,
-            'current_category': category,
+            'session_id': session_id,
+            'current_category': current_category
+        })
+
+    @app.route('/quizzes/sessions/<session_id>/questions', methods=['POST'])
+    def next_quiz_session_question(session_id):
+        try:
+            result = quiz.next_session_question(
+                quiz_store, session_id, app.config['QUIZ_SESSION_TTL'])
+        except OSError:
+            print(sys.exc_info())
+            abort(503)
+        if result is None:
+            abort(404)
+        category_id, question = result
+        if question:
+            question_stats.served(question.id)
+
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'question': question.format() if question else False,
+            'current_category': quiz_category(category_id)
+        })
+
+    @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+    def delete_quiz_session(session_id):
+        try:
+            deleted = quiz_store.delete(session_id)
+        except OSError:
+            print(sys.exc_info())
+            abort(503)
+        if not deleted:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'deleted': session_id
+        })
+
+    @app.route('/questions/<int:question_id>/answers', methods=['POST'])
+    def answer_question(question_id):
+        body = request.get_json() or {}
+        correct = body.get('correct')
+        if not isinstance(correct, bool):
+            abort(422)
+        exists = db.session.query(Question.id).\
+            filter(Question.id == question_id).scalar()
+        if exists is None:
+            abort(404)
+        question_stats.answered(question_id, correct)
+
+        return jsonify({
+            'success': True,
+            'question_id': question_id,
+            'correct': correct
+        })
+
+    @app.route('/categories/<int:category_id>/questions/'
+               '<any(hardest, easiest):order>')
+    def retrieve_ranked_questions(category_id, order):
+        category = category_by_id(category_id)
+        limit = request.args.get('limit', QUESTIONS_PER_PAGE, type=int)
+        min_answers = request.args.get('min_answers', MIN_ANSWERS, type=int)
+        if not 1 <= limit <= MAX_QUESTIONS_PER_PAGE:
+            abort(422)
+        questions = ranked_questions(category_id, order == 'hardest',
+                                     limit, min_answers)
+
+        return jsonify({
+            'success': True,
+            'questions': questions,
+            'current_category': category
+        })
+
+    @app.route('/pool/metrics')
+    def retrieve_pool_metrics():
+        return jsonify({
+            'success': True,
+            'pool': pool_status(db.engine)
         })
 
     @app.errorhandler(404)
@@ -240,6 +495,14 @@ def create_app(test_config=None):
             'message': 'umprocessable'
         }), 422
 
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return jsonify({
+            'success': False,
+            'error': 503,
+            'message': 'service unavailable'
+        }), 503
+
     @app.errorhandler(405)
     def method_not_allowed(error):
         return jsonify({
@@ -0,0 +1,146 @@
+'''
+Databases and data for the tests and benchmarks.
+
+Both run against TEST_DATABASE_URL when it is set and otherwise against a
+SQLite file in a temporary directory, so neither needs a database server.
+The data is deterministic: the sample questions of trivia.psql, or
+questions generated from a seed.
+'''
+import os
+import random
+import re
+import shutil
+import tempfile
+
+from models import db, Question, Category, QuestionStat, category_cache, \
+    question_ids
+from search import memory_index
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'trivia.psql')
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+WORDS = ['which', 'country', 'river', 'painter', 'invented', 'first',
+         'largest', 'planet', 'team', 'won', 'world', 'cup', 'discovered',
+         'element', 'capital', 'city', 'ocean', 'novel', 'wrote', 'film']
+INSERT_CHUNK = 10000
+# backslash escapes of the COPY text format
+COPY_ESCAPE = re.compile(r'\\(.)')
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r'}
+
+
+class TemporaryDatabase:
+    '''
+    The database of one test or benchmark run: TEST_DATABASE_URL when it
+    is set, otherwise a new SQLite file that close() removes.
+    '''
+
+    def __init__(self, url=None):
+        url = url or os.environ.get('TEST_DATABASE_URL')
+        self.directory = None
+        if url is None:
+            self.directory = tempfile.mkdtemp(prefix='trivia-')
+            url = 'sqlite:///' + os.path.join(self.directory, 'trivia.db')
+        self.url = url
+
+    def close(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+def copy_value(value):
+    if value == '\\N':
+        return None
+    return COPY_ESCAPE.sub(
+        lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def read_sample_data(path=SAMPLE_DATA):
+    '''
+    Reads the COPY blocks of a pg_dump file, returning the rows of each
+    table as dicts: {'categories': [...], 'questions': [...]}.
+    '''
+    tables = {}
+    rows = None
+    with open(path, encoding='utf-8') as dump:
+        for line in dump:
+            line = line.rstrip('\n')
+            if rows is None:
+                if line.startswith('COPY '):
+                    table, columns = line[5:].split(' (', 1)
+                    columns = columns.split(')', 1)[0].split(', ')
+                    rows = tables.setdefault(table.split('.')[-1], [])
+            elif line == '\\.':
+                rows = None
+            else:
+                rows.append(dict(zip(
+                    columns, map(copy_value, line.split('\t')))))
+    for question in tables.get('questions', []):
+        question['id'] = int(question['id'])
+        question['difficulty'] = int(question['difficulty'])
+    for category in tables.get('categories', []):
+        category['id'] = int(category['id'])
+    return tables
+
+
+def generate_questions(num_questions, seed_value=0):
+    '''Yields num_questions question rows, the same ones for a seed_value.'''
+    rng = random.Random(seed_value)
+    for i in range(num_questions):
+        yield {
+            'id': i + 1,
+            'question': '{} {}?'.format(
+                ' '.join(rng.sample(WORDS, 6)).capitalize(), i + 1),
+            'answer': ' '.join(rng.sample(WORDS, 2)),
+            'category': str(rng.randint(1, len(CATEGORIES))),
+            'difficulty': rng.randint(1, 5)
+        }
+
+
+def load(app, categories, questions):
+    '''
+    Replaces the categories, questions and question stats with the given
+    rows, inserting INSERT_CHUNK questions per statement, and clears what
+    the app cached about the old ones. Needs an app context.
+    '''
+    db.session.query(QuestionStat).delete()
+    db.session.query(Question).delete()
+    db.session.query(Category).delete()
+    db.session.execute(Category.__table__.insert(), list(categories))
+
+    last_id = 0
+    chunk = []
+    for row in questions:
+        chunk.append(row)
+        last_id = max(last_id, row['id'])
+        if len(chunk) == INSERT_CHUNK:
+            db.session.execute(Question.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(Question.__table__.insert(), chunk)
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        # the rows brought their ids; new questions continue after them
+        db.session.execute(
+            "SELECT setval('questions_id_seq', {})".format(max(last_id, 1)))
+        db.session.commit()
+
+    # bulk deletes and inserts bypass the mapper events
+    category_cache.invalidate()
+    question_ids.invalidate()
+    memory_index.reset()
+    app.extensions['question_counts'].clear()
+
+
+def load_sample_data(app, sample=None):
+    '''Loads the 6 categories and 19 questions of trivia.psql.'''
+    sample = sample or read_sample_data()
+    load(app, sample['categories'], sample['questions'])
+
+
+def seed(app, num_questions, seed_value=0):
+    '''Loads the six categories and num_questions generated questions.'''
+    categories = [{'id': i + 1, 'type': name}
+                  for i, name in enumerate(CATEGORIES)]
+    load(app, categories, generate_questions(num_questions, seed_value))
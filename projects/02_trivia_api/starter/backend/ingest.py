@@ -0,0 +1,130 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question, category_cache, question_ids
+from search import memory_index
+
+INGEST_CHUNK = 1000
+FIELDS = ('question', 'answer', 'category', 'difficulty')
+
+
+class IngestReport:
+    '''Counts of an ingestion run; rejected records keep their line and reason.'''
+
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def format(self, max_errors=20):
+        return {
+            'inserted': self.inserted,
+            'rejected': len(self.rejected),
+            'errors': [{'line': line, 'reason': reason}
+                       for line, reason in self.rejected[:max_errors]],
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1)
+        }
+
+
+def read_records(stream, format):
+    '''
+    Yields (line number, record) for every CSV row or NDJSON line of
+    stream; a line that is not valid JSON yields its error instead.
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as error:
+            yield line_number, error
+
+
+def validate(record, categories):
+    '''Returns (row, None) for a valid record or (None, reason).'''
+    if isinstance(record, ValueError):
+        return None, 'invalid JSON: {}'.format(record)
+    if not isinstance(record, dict):
+        return None, 'not an object'
+    missing = [field for field in FIELDS if record.get(field) in (None, '')]
+    if missing:
+        return None, 'missing {}'.format(', '.join(missing))
+    try:
+        category = int(record['category'])
+        difficulty = int(record['difficulty'])
+    except (TypeError, ValueError):
+        return None, 'category and difficulty must be integers'
+    if category not in categories:
+        return None, 'unknown category {}'.format(category)
+    return {
+        'question': str(record['question']),
+        'answer': str(record['answer']),
+        'category': str(category),
+        'difficulty': difficulty
+    }, None
+
+
+def ingest(records, chunk_size=INGEST_CHUNK, on_chunk=None):
+    '''
+    ingest(records, chunk_size, on_chunk)
+        inserts (line number, record) pairs as questions, chunk_size rows
+        per statement and commit. Categories are checked against the
+        category cache, so validation does not query the database. A chunk
+        the database rejects is rolled back as a whole. on_chunk, if
+        given, is called with the report after every chunk.
+        Returns an IngestReport.
+    '''
+    report = IngestReport()
+    categories = category_cache.get()['types']
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        row_lines = []
+        for line_number, record in chunk:
+            row, reason = validate(record, categories)
+            if reason is None:
+                rows.append(row)
+                row_lines.append(line_number)
+            else:
+                report.rejected.append((line_number, reason))
+        if rows:
+            try:
+                db.session.execute(Question.__table__.insert(), rows)
+                db.session.commit()
+                report.inserted += len(rows)
+            except SQLAlchemyError as error:
+                db.session.rollback()
+                reason = 'chunk rolled back: {}'.format(
+                    getattr(error, 'orig', error))
+                report.rejected.extend(
+                    (line_number, reason) for line_number in row_lines)
+        if on_chunk is not None:
+            on_chunk(report)
+
+    # the bulk insert bypasses the ORM events that keep these current
+    question_ids.invalidate()
+    memory_index.reset()
+    return report.finish()
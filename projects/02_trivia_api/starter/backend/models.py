@@ -1,13 +1,25 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import hashlib
+from array import array
+import threading
+import time
+from sqlalchemy import Column, String, Integer, create_engine, event
+from sqlalchemy.orm import Session
 from flask_sqlalchemy import SQLAlchemy
+from db_pool import engine_options
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "postgres://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
+# bound how long other processes serve rows changed elsewhere
+CATEGORY_CACHE_TTL = 300
+QUESTION_IDS_TTL = 300
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -15,6 +27,7 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -25,6 +38,8 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  # serves category pages in id order without sorting
+  __table_args__ = (db.Index('ix_questions_category_id', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
@@ -40,7 +55,11 @@ class Question(db.Model):
 
   def insert(self):
     db.session.add(self)
+    db.session.flush()
+    # read before commit expires it, so callers need not reload the row
+    question_id = self.id
     db.session.commit()
+    return question_id
   
   def update(self):
     db.session.commit()
@@ -75,4 +94,117 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+QuestionStat
+    how often a question was served in quizzes, answered and answered
+    correctly. Written in batches by stats.StatsRecorder.
+'''
+class QuestionStat(db.Model):
+  __tablename__ = 'question_stats'
+
+  question_id = Column(Integer, primary_key=True, autoincrement=False)
+  served = Column(Integer, nullable=False, default=0, server_default='0')
+  answered = Column(Integer, nullable=False, default=0, server_default='0')
+  correct = Column(Integer, nullable=False, default=0, server_default='0')
+
+  def format(self):
+    return {
+      'served': self.served,
+      'answered': self.answered,
+      'correct': self.correct
+    }
+
+
+'''
+VersionedCache
+    values computed by load(key) from the database, shared by every
+    request until invalidate() is called or ttl passes. Each load is tagged
+    with the cache version it was read at, and a load that raced an
+    invalidation is not kept.
+'''
+class VersionedCache:
+
+  def __init__(self, load, ttl):
+    self.load_value = load
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.version = 0
+    self.snapshots = {}
+
+  def invalidate(self, *args):
+    with self.lock:
+      self.version += 1
+      self.snapshots.clear()
+
+  def get(self, key=None):
+    '''
+    Returns the snapshot of key: the dict returned by load(key) with the
+    'version' it was loaded at.
+    '''
+    snapshot = self.snapshots.get(key)
+    if snapshot is None or snapshot['expires'] <= time.monotonic():
+      snapshot = self.load(key)
+    return snapshot
+
+  def load(self, key):
+    with self.lock:
+      version = self.version
+    snapshot = self.load_value(key)
+    snapshot['version'] = version
+    snapshot['expires'] = time.monotonic() + self.ttl
+    with self.lock:
+      if self.version == version:
+        self.snapshots[key] = snapshot
+    return snapshot
+
+
+def load_categories(key):
+  rows = db.session.query(Category.id, Category.type).\
+    order_by(Category.id).all()
+  return {
+    'types': {category_id: type for category_id, type in rows},
+    'etag': hashlib.sha1(json.dumps(rows).encode()).hexdigest()
+  }
+
+
+def load_question_ids(category_id):
+  selection = db.session.query(Question.id)
+  if category_id:
+    selection = selection.filter(Question.category == category_id)
+  return {'ids': array('l', (row[0] for row in selection))}
+
+
+# the categories by id in id order ('types') and their 'etag'
+category_cache = VersionedCache(load_categories, CATEGORY_CACHE_TTL)
+# the question ids ('ids') of a category id, or of every category for 0
+question_ids = VersionedCache(load_question_ids, QUESTION_IDS_TTL)
+
+
+def invalidate_on_change(model, cache):
+  '''
+  Invalidates cache when rows of model are inserted, updated or deleted
+  through the ORM: at flush for this session and again after commit, so a
+  load that read the old rows in between is dropped.
+  '''
+  flag = 'changed:{}'.format(model.__tablename__)
+
+  def changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+      session.info[flag] = True
+    cache.invalidate()
+
+  def session_ended(session):
+    if session.info.pop(flag, False):
+      cache.invalidate()
+
+  for event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(model, event_name, changed)
+  event.listen(Session, 'after_commit', session_ended)
+  event.listen(Session, 'after_rollback', session_ended)
+
+
+invalidate_on_change(Category, category_cache)
+invalidate_on_change(Question, question_ids)
@@ -0,0 +1,76 @@
+import random
+import secrets
+from itertools import chain
+
+from models import Question, question_ids
+
+# random draws before falling back to a scan of the remaining ids
+SAMPLE_TRIES = 32
+
+
+def sample_unseen(ids, seen, rng=random):
+    '''
+    sample_unseen(ids, seen)
+        returns a random id of ids that is not in the set seen, or None
+        when every id has been seen. Random draws are tried first, which
+        takes O(1) time until most ids are seen; after SAMPLE_TRIES misses
+        the ids are scanned from a random position. seen may be any
+        container; one with a snapshot() method, such as the seen ids of
+        a Redis session, is fetched whole once before the scan.
+    '''
+    if not ids:
+        return None
+    for _ in range(SAMPLE_TRIES):
+        candidate = ids[rng.randrange(len(ids))]
+        if candidate not in seen:
+            return candidate
+    if hasattr(seen, 'snapshot'):
+        seen = seen.snapshot()
+    start = rng.randrange(len(ids))
+    for index in chain(range(start, len(ids)), range(start)):
+        if ids[index] not in seen:
+            return ids[index]
+    return None
+
+
+def next_question(category_id, seen):
+    '''
+    next_question(category_id, seen)
+        returns a random Question of the category (of all categories for
+        0) whose id is not in seen, or None when none is left
+    '''
+    for _ in range(2):
+        ids = question_ids.get(category_id)['ids']
+        question_id = sample_unseen(ids, seen)
+        if question_id is None:
+            return None
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question
+        # deleted by another process since the ids were cached
+        question_ids.invalidate()
+    return None
+
+
+def start_session(store, category_id, ttl):
+    '''Creates a quiz session over a category and returns its id.'''
+    session_id = secrets.token_urlsafe(16)
+    store.create(session_id, category_id, ttl)
+    return session_id
+
+
+def next_session_question(store, session_id, ttl):
+    '''
+    next_session_question(store, session_id, ttl)
+        returns (category_id, question) for the next unseen question of a
+        quiz session and records it as seen; question is None when the
+        category is exhausted. Returns None for an unknown session.
+    '''
+    session = store.load(session_id)
+    if session is None:
+        return None
+    category_id, seen = session
+    question = next_question(category_id, seen)
+    if question is not None:
+        store.add_seen(session_id, question.id, ttl)
+    return category_id, question
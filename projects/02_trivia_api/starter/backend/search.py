@@ -0,0 +1,208 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import DDL, event, func, literal
+
+from models import db, Question
+
+# no stemming or stop words, so short words such as 'what' stay searchable
+SEARCH_CONFIG = 'simple'
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN.findall((text or '').lower())
+
+
+def search_vector():
+    '''The tsvector over question and answer, as indexed by ix_questions_search.'''
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        func.coalesce(Question.question, '') + literal(' ') +
+        func.coalesce(Question.answer, ''))
+
+
+event.listen(
+    Question.__table__, 'after_create',
+    DDL("CREATE INDEX ix_questions_search ON questions USING gin "
+        "(to_tsvector('simple', coalesce(question, '') || ' ' || "
+        "coalesce(answer, '')))").execute_if(dialect='postgresql'))
+
+
+def search_query(term):
+    '''
+    Builds a tsquery matching every word of term, the last one as a
+    prefix so that results appear while the user is still typing.
+    Returns None when term has no words.
+    '''
+    tokens = tokenize(term)
+    if not tokens:
+        return None
+    tokens[-1] += ':*'
+    return func.to_tsquery(SEARCH_CONFIG, ' & '.join(tokens))
+
+
+def search_database(term, category_id, offset, limit):
+    vector = search_vector()
+    query = search_query(term)
+    if query is None:
+        return [], 0
+    selection = Question.query.filter(vector.op('@@')(query))
+    if category_id:
+        selection = selection.filter(Question.category == category_id)
+    total = selection.count()
+    questions = selection.\
+        order_by(func.ts_rank_cd(vector, query).desc(), Question.id).\
+        offset(offset).limit(limit).all()
+    return questions, total
+
+
+class InvertedIndex:
+    '''
+    Token postings over question and answer, for databases without full
+    text search. Built from the table on first use and kept current by
+    the ORM events of Question; call reset() after changing questions
+    through bulk statements. Results are ranked by tf-idf with length
+    normalisation, and the last word of a query matches as a prefix.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.postings = {}
+        self.vocabulary = []
+        self.documents = {}
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+            self.postings = {}
+            self.vocabulary = []
+            self.documents = {}
+
+    def build(self):
+        rows = db.session.query(Question.id, Question.question,
+                                Question.answer, Question.category)
+        with self.lock:
+            if self.built:
+                return
+            for row in rows:
+                self.add_locked(*row)
+            self.vocabulary = sorted(self.postings)
+            self.built = True
+
+    def add_locked(self, question_id, question, answer, category):
+        counts = {}
+        for token in tokenize(question) + tokenize(answer):
+            counts[token] = counts.get(token, 0) + 1
+        self.documents[question_id] = (category, sum(counts.values()),
+                                       list(counts))
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[question_id] = count
+
+    def remove_locked(self, question_id):
+        document = self.documents.pop(question_id, None)
+        if document is None:
+            return
+        for token in document[2]:
+            postings = self.postings[token]
+            del postings[question_id]
+            if not postings:
+                del self.postings[token]
+
+    def update(self, question_id, question=None, answer=None, category=None,
+               deleted=False):
+        with self.lock:
+            if not self.built:
+                return
+            self.remove_locked(question_id)
+            if not deleted:
+                self.add_locked(question_id, question, answer, category)
+            # sorted again by the next search
+            self.vocabulary = None
+
+    def matches(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        start = bisect_left(self.vocabulary, token)
+        end = bisect_left(self.vocabulary, token + '\uffff')
+        return self.vocabulary[start:end]
+
+    def search(self, term, category_id, offset, limit):
+        '''Returns (ids of the requested page, total number of matches).'''
+        if not self.built:
+            self.build()
+        tokens = tokenize(term)
+        if not tokens:
+            return [], 0
+        with self.lock:
+            if self.vocabulary is None:
+                self.vocabulary = sorted(self.postings)
+            scores = None
+            for position, token in enumerate(tokens):
+                token_scores = {}
+                for match in self.matches(token,
+                                          position == len(tokens) - 1):
+                    postings = self.postings[match]
+                    idf = math.log(1 + len(self.documents) / len(postings))
+                    for question_id, count in postings.items():
+                        token_scores[question_id] = \
+                            token_scores.get(question_id, 0) + count * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # every word must match
+                    scores = {question_id: score + token_scores[question_id]
+                              for question_id, score in scores.items()
+                              if question_id in token_scores}
+            if category_id:
+                category = str(category_id)
+                scores = {question_id: score
+                          for question_id, score in scores.items()
+                          if str(self.documents[question_id][0]) == category}
+            # only the requested page and those before it are ordered
+            ranked = heapq.nsmallest(
+                offset + limit, scores,
+                key=lambda question_id: (
+                    -scores[question_id] /
+                    math.sqrt(self.documents[question_id][1]),
+                    question_id))
+        return ranked[offset:], len(scores)
+
+
+memory_index = InvertedIndex()
+
+
+def question_changed(mapper, connection, target):
+    memory_index.update(target.id, target.question, target.answer,
+                        target.category)
+
+
+def question_deleted(mapper, connection, target):
+    memory_index.update(target.id, deleted=True)
+
+
+event.listen(Question, 'after_insert', question_changed)
+event.listen(Question, 'after_update', question_changed)
+event.listen(Question, 'after_delete', question_deleted)
+
+
+def search_questions(term, category_id=None, offset=0, limit=10):
+    '''
+    search_questions(term, category_id, offset, limit)
+        returns (questions, total): one page of the questions whose
+        question or answer contains every word of term, best match
+        first, optionally within a category
+    '''
+    if db.engine.dialect.name == 'postgresql':
+        return search_database(term, category_id, offset, limit)
+
+    ids, total = memory_index.search(term, category_id, offset, limit)
+    questions = Question.query.filter(Question.id.in_(ids)).all() \
+        if ids else []
+    by_id = {question.id: question for question in questions}
+    return [by_id[question_id] for question_id in ids
+            if question_id in by_id], total
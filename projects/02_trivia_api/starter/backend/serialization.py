@@ -0,0 +1,52 @@
+import json
+
+from flask import Response
+
+from models import Question
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+# the columns of Question.format(), fetched as plain tuples
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+# names of the columnar format; categories is taken by the category map
+COLUMN_NAMES = ('ids', 'questions', 'answers', 'category_ids', 'difficulties')
+
+
+def question_rows(selection):
+    '''
+    Runs selection, a Question query, for the formatted columns only,
+    returning tuples that bypass ORM instances and the identity map.
+    '''
+    return selection.with_entities(*QUESTION_COLUMNS).all()
+
+
+def records(rows):
+    '''The rows as Question.format() dicts.'''
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+def columns(rows):
+    '''
+    The rows as one list per column, e.g. {"ids": [...], "questions": [...]},
+    which spares clients of large pages a key per value.
+    '''
+    if not rows:
+        return {name: [] for name in COLUMN_NAMES}
+    return dict(zip(COLUMN_NAMES, map(list, zip(*rows))))
+
+
+def dumps(payload):
+    '''Encodes payload as JSON bytes, with orjson when it is installed.'''
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status,
+                    mimetype='application/json')
@@ -0,0 +1,219 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+class MemoryStore:
+    '''
+    Quiz sessions held in this process. A session expires ttl seconds
+    after it was last used; expired sessions are swept on every write,
+    and the least recently used are dropped beyond max_sessions.
+    '''
+
+    name = 'memory'
+
+    def __init__(self, max_sessions=100000):
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def sweep(self, now):
+        # sessions are kept in order of last use, so expired ones lead
+        while self.sessions:
+            session_id, (expires, _, _) = next(iter(self.sessions.items()))
+            if expires > now and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+
+    def create(self, session_id, category_id, ttl):
+        with self.lock:
+            now = time.monotonic()
+            self.sessions[session_id] = (now + ttl, category_id, set())
+            self.sweep(now)
+
+    def load(self, session_id):
+        '''Returns (category_id, set of seen ids), or None if unknown.'''
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or session[0] <= time.monotonic():
+                return None
+            # the set itself: callers only test membership
+            return session[1], session[2]
+
+    def add_seen(self, session_id, question_id, ttl):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return
+            now = time.monotonic()
+            session[2].add(question_id)
+            self.sessions[session_id] = (now + ttl, session[1], session[2])
+            self.sessions.move_to_end(session_id)
+            self.sweep(now)
+
+    def delete(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+
+class RedisStore:
+    '''
+    Quiz sessions in Redis, or any server speaking the Redis protocol,
+    shared by every worker. A session is a string key holding its
+    category id and a set key of the seen question ids, so loading a
+    session and testing a sampled question are single-key lookups
+    whatever the number of questions seen.
+    '''
+
+    name = 'redis'
+
+    def __init__(self, host='localhost', port=6379, db=0, timeout=0.5,
+                 prefix='trivia:quiz:'):
+        self.address = (host, port)
+        self.db = db
+        self.timeout = timeout
+        self.prefix = prefix
+        self.sock = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, self.timeout)
+        self.file = self.sock.makefile('rb')
+        if self.db:
+            self.send('SELECT', self.db)
+
+    def close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+        self.sock = None
+        self.file = None
+
+    @staticmethod
+    def encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def send(self, *args):
+        self.sock.sendall(self.encode(args))
+        return self.read_reply()
+
+    def send_transaction(self, commands):
+        # MULTI, the commands and EXEC go out in one write; the queued
+        # replies are skipped and EXEC's array holds the results
+        commands = [('MULTI',)] + list(commands) + [('EXEC',)]
+        self.sock.sendall(b''.join(self.encode(args) for args in commands))
+        replies = [self.read_reply() for _ in commands]
+        if replies[-1] is None:
+            raise ConnectionError('transaction aborted by session store')
+        return replies[-1]
+
+    def read_reply(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('connection closed by session store')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise ConnectionError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            return self.file.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise ConnectionError('unexpected reply from session store')
+
+    def command(self, *args):
+        return self.call(self.send, *args)
+
+    def transaction(self, *commands):
+        '''Runs commands atomically in one round trip; returns the results.'''
+        return self.call(self.send_transaction, commands)
+
+    def call(self, send, *args):
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.connect()
+                return send(*args)
+            except (OSError, ValueError):
+                # drop the connection so the next command reconnects
+                self.close()
+                raise
+
+    def keys(self, session_id):
+        key = self.prefix + session_id
+        return key, key + ':seen'
+
+    def create(self, session_id, category_id, ttl):
+        key, _ = self.keys(session_id)
+        self.command('SET', key, category_id, 'EX', int(ttl))
+
+    def load(self, session_id):
+        key, seen_key = self.keys(session_id)
+        category_id = self.command('GET', key)
+        if category_id is None:
+            return None
+        return int(category_id), RedisSeen(self, seen_key)
+
+    def add_seen(self, session_id, question_id, ttl):
+        key, seen_key = self.keys(session_id)
+        # if the session expired since it was loaded, the set added here
+        # is orphaned and expires with the ttl; load() never finds it
+        self.transaction(('EXPIRE', key, int(ttl)),
+                         ('SADD', seen_key, question_id),
+                         ('EXPIRE', seen_key, int(ttl)))
+
+    def delete(self, session_id):
+        return self.command('DEL', *self.keys(session_id)) > 0
+
+
+class RedisSeen:
+    '''
+    The seen question ids of a Redis session. Membership tests ask the
+    server with SISMEMBER, one id at a time; snapshot() fetches the whole
+    set for callers that test many ids.
+    '''
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def __contains__(self, question_id):
+        return self.store.command('SISMEMBER', self.key, question_id) == 1
+
+    def snapshot(self):
+        return {int(value) for value in self.store.command('SMEMBERS',
+                                                           self.key)}
+
+
+def make_store(url):
+    '''
+    make_store(url)
+        builds a session store from a URL such as
+        'memory://?max_sessions=100000' or 'redis://localhost:6379/0'
+    '''
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        options = parse_qs(parsed.query)
+        max_sessions = int(options.get('max_sessions', ['100000'])[0])
+        return MemoryStore(max_sessions)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.strip('/') or 0)
+        return RedisStore(parsed.hostname or 'localhost',
+                          parsed.port or 6379, db)
+    raise ValueError('unsupported session store URL: {}'.format(url))
@@ -0,0 +1,137 @@
+import atexit
+import logging
+import os
+import threading
+
+from sqlalchemy import Float, cast, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question, QuestionStat
+
+logger = logging.getLogger(__name__)
+
+# answers a question needs before it is ranked by difficulty
+MIN_ANSWERS = 5
+
+# SQLite (3.24+) and PostgreSQL both accept this upsert
+UPSERT = text(
+    'INSERT INTO question_stats (question_id, served, answered, correct) '
+    'VALUES (:question_id, :served, :answered, :correct) '
+    'ON CONFLICT (question_id) DO UPDATE SET '
+    'served = question_stats.served + excluded.served, '
+    'answered = question_stats.answered + excluded.answered, '
+    'correct = question_stats.correct + excluded.correct')
+
+
+class StatsRecorder:
+    '''
+    Counts how often questions are served, answered and answered correctly
+    in process memory, and adds the counts to question_stats in one
+    batched upsert when flush_size questions have pending counts, every
+    flush_interval seconds, and when the process exits. Counts of a
+    failed flush are kept for the next one.
+    '''
+
+    def __init__(self, app, flush_interval=10, flush_size=1000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.lock = threading.Lock()
+        # flushes run one at a time, outside self.lock
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        self.pid = None
+        atexit.register(self.close)
+
+    def record(self, question_id, served=0, answered=0, correct=0):
+        with self.lock:
+            counts = self.pending.setdefault(question_id, [0, 0, 0])
+            counts[0] += served
+            counts[1] += answered
+            counts[2] += correct
+            full = len(self.pending) >= self.flush_size
+        self.start()
+        if full:
+            self.flush()
+
+    def served(self, question_id):
+        self.record(question_id, served=1)
+
+    def answered(self, question_id, correct):
+        self.record(question_id, answered=1, correct=1 if correct else 0)
+
+    def start(self):
+        # started on first use, so a worker forked after create_app
+        # runs its own timer
+        if self.pid == os.getpid() or self.flush_interval <= 0:
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True,
+                                           name='question-stats-flush')
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        '''Writes the pending counts; returns the number of questions written.'''
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            rows = [{'question_id': question_id, 'served': served,
+                     'answered': answered, 'correct': correct}
+                    for question_id, (served, answered, correct)
+                    in pending.items()]
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(UPSERT, rows)
+            except SQLAlchemyError:
+                logger.exception('could not flush %d question stats',
+                                 len(rows))
+                with self.lock:
+                    for question_id, counts in pending.items():
+                        merged = self.pending.setdefault(question_id,
+                                                         [0, 0, 0])
+                        for index, count in enumerate(counts):
+                            merged[index] += count
+                return 0
+            return len(rows)
+
+    def close(self):
+        self.stopped.set()
+        self.flush()
+
+
+def ranked_questions(category_id, hardest=True, limit=10,
+                     min_answers=MIN_ANSWERS):
+    '''
+    The questions of a category answered at least min_answers times, by
+    the share of correct answers: lowest first when hardest, else highest.
+    Returns question dicts with their counts and correct_rate.
+    '''
+    rate = cast(QuestionStat.correct, Float) / QuestionStat.answered
+    selection = db.session.query(Question, QuestionStat, rate).\
+        join(QuestionStat, QuestionStat.question_id == Question.id).\
+        filter(Question.category == str(category_id),
+               QuestionStat.answered >= max(min_answers, 1)).\
+        order_by(rate if hardest else rate.desc(),
+                 QuestionStat.answered.desc(), Question.id).\
+        limit(limit)
+
+    questions = []
+    for question, stat, correct_rate in selection:
+        formatted = question.format()
+        formatted.update(stat.format())
+        formatted['correct_rate'] = round(correct_rate, 4)
+        questions.append(formatted)
+    return questions
@@ -1,34 +1,47 @@
 import os
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, Question, Category, QuestionStat
+from harness import TemporaryDatabase, load_sample_data, read_sample_data
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Create the database and the app once for all tests."""
+        cls.database = TemporaryDatabase()
+        cls.database_path = cls.database.url
+        cls.app = create_app({'SQLALCHEMY_DATABASE_URI': cls.database_path})
+        cls.sample = read_sample_data()
+        cls.total_questions = len(cls.sample['questions'])
+        cls.total_categories = len(cls.sample['categories'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.extensions['question_stats'].close()
+        with cls.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        cls.database.close()
+
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Reload the sample questions so every test starts from them."""
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
-
-        # binds the app to the current context
         with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+            load_sample_data(self.app, self.sample)
+
     def tearDown(self):
         """Executed after reach test"""
         pass
 
+    def category_total(self, category_id):
+        return sum(1 for question in self.sample['questions']
+                   if question['category'] == str(category_id))
+
     """
     TODO
     Write at least one test for each test for successful operation and for expected errors.
@@ -41,8 +54,27 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
-        self.assertEqual(data['total_categories'], 6)
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(data['total_categories'], self.total_categories)
+        self.assertEqual(len(data['categories']), self.total_categories)
+
+    # test for conditional requests against categories
+    def test_304_for_unchanged_categories(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+
+    # test for the cached categories sparing database queries
+    def test_query_count_for_questions(self):
+        app = create_app({'QUERY_COUNT_HEADER': True,
+                          'SQLALCHEMY_DATABASE_URI': self.database_path})
+        client = app.test_client()
+        client.get('/questions')
+        res = client.get('/questions?page=2')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['X-Query-Count'], '1')
 
     # test for retrieving paginated questions
     def test_retrieve_questions(self):
@@ -53,9 +85,37 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertEqual(len(data['questions']), 10)
-        self.assertEqual(data['total_questions'], 19)
+        self.assertEqual(data['total_questions'], self.total_questions)
         self.assertTrue(data['current_category'])
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(len(data['categories']), self.total_categories)
+
+    # test for keyset pagination of questions
+    def test_retrieve_questions_after_id(self):
+        '''Test retrieving the questions following a question id'''
+        res = self.client().get('/questions')
+        first_page = json.loads(res.data)['questions']
+        res = self.client().get(
+            '/questions?after_id={}'.format(first_page[4]['id']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'][:5], first_page[5:])
+        self.assertEqual(data['total_questions'], self.total_questions)
+
+    # test for the columnar format of questions
+    def test_retrieve_questions_columnar(self):
+        res = self.client().get('/questions')
+        questions = json.loads(res.data)['questions']
+        res = self.client().get('/questions?format=columnar')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['ids'], [question['id'] for question in questions])
+        self.assertEqual(data['answers'],
+                         [question['answer'] for question in questions])
+        self.assertEqual(data['questions'][0], questions[0]['question'])
+        self.assertEqual(data['total_questions'], self.total_questions)
 
     # test 404 for retrieving over page questions
     def test_404_for_overpage_questions(self):
@@ -80,9 +140,9 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['deleted'], delete_id)
         self.assertEqual(len(data['questions']), 10)
-        self.assertEqual(data['total_questions'], 19)
+        self.assertEqual(data['total_questions'], self.total_questions - 1)
         self.assertTrue(data['current_category'])
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(len(data['categories']), self.total_categories)
 
     # test 422 for delete against nonexist question
     def test_422_for_delete_against_nonexist_question(self):
@@ -112,9 +172,9 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['created'])
         self.assertEqual(len(data['questions']), 10)
-        self.assertEqual(data['total_questions'], 20)
+        self.assertEqual(data['total_questions'], self.total_questions + 1)
         self.assertTrue(data['current_category'])
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(len(data['categories']), self.total_categories)
 
     # test 422 for key less creation
     def test_422_for_keyword_less_creation(self):
@@ -142,7 +202,23 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(len(data['questions']), 8)
         self.assertEqual(data['total_questions'], 8)
         self.assertTrue(data['current_category'])
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(len(data['categories']), self.total_categories)
+
+    # test for searching answers within a category
+    def test_search_answers_by_category(self):
+        res = self.client().post(
+            '/questions', json={'searchTerm': 'fleming', 'category': 1})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Alexander Fleming')
+
+        res = self.client().post(
+            '/questions', json={'searchTerm': 'fleming', 'category': 2})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['total_questions'], 0)
 
     # test retrieving question accourding to their categories
     def test_retrieve_questions_by_category(self):
@@ -152,10 +228,10 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
-        self.assertEqual(len(data['questions']), 3)
-        self.assertEqual(data['total_questions'], 3)
+        self.assertEqual(len(data['questions']), self.category_total(1))
+        self.assertEqual(data['total_questions'], self.category_total(1))
         self.assertEqual(data['current_category']['id'], 1)
-        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(len(data['categories']), self.total_categories)
     
     # test 404 for nonextist category
     def test_404_for_nonexist_category(self):
@@ -187,6 +263,35 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(type(data['question']), dict)
         self.assertEqual(data['current_category']['id'], 1)
 
+    # test for a quiz played through a server-side session
+    def test_quiz_session(self):
+        res = self.client().post(
+            '/quizzes/sessions',
+            json={'quiz_category': {'id': 1, 'type': 'Science'}}
+        )
+        session_id = json.loads(res.data)['session_id']
+        asked = []
+        while True:
+            res = self.client().post(
+                '/quizzes/sessions/{}/questions'.format(session_id))
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if not data['question']:
+                break
+            self.assertNotIn(data['question']['id'], asked)
+            asked.append(data['question']['id'])
+
+        res = self.client().get('/categories/1/questions')
+        self.assertEqual(len(asked), json.loads(res.data)['total_questions'])
+
+    # test 404 for an unknown quiz session
+    def test_404_for_unknown_quiz_session(self):
+        res = self.client().post('/quizzes/sessions/unknown/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
     # test 405 for get method to retrieve quiz
     def test_405_for_get_method_against_quiz(self):
         res = self.client().get('/quizzes')
@@ -197,6 +302,108 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 405)
         self.assertEqual(data['message'], 'method not allowed')
 
+    # test for a minimal response to creation and deletion
+    def test_minimal_write_responses(self):
+        res = self.client().post(
+            '/questions',
+            json={
+                'question': 'Which header asks for a minimal response?',
+                'answer': 'Prefer',
+                'category': 1,
+                'difficulty': 1
+            },
+            headers={'Prefer': 'return=minimal'}
+        )
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], self.total_questions + 1)
+        self.assertNotIn('questions', data)
+        self.assertEqual(res.headers['Preference-Applied'], 'return=minimal')
+
+        res = self.client().delete(
+            '/questions/{}?response=minimal'.format(data['created']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], self.total_questions)
+        self.assertEqual(set(data), {'success', 'deleted', 'total_questions'})
+
+    # test for bulk ingestion of NDJSON questions
+    def test_ingest_questions(self):
+        lines = [
+            json.dumps({'question': 'Bulk question {}?'.format(i),
+                        'answer': 'Bulk answer', 'category': 1,
+                        'difficulty': 2})
+            for i in range(2)
+        ]
+        lines.append(json.dumps({'question': 'Bulk question?',
+                                 'answer': 'Bulk answer', 'category': 100,
+                                 'difficulty': 2}))
+        res = self.client().post('/questions/bulk', data='\n'.join(lines),
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        with self.app.app_context():
+            Question.query.filter(Question.answer == 'Bulk answer').\
+                delete(synchronize_session=False)
+            db.session.commit()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 2)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['errors'][0]['line'], 3)
+
+    # test for connection pool metrics
+    def test_pool_metrics(self):
+        self.client().get('/categories')
+        res = self.client().get('/pool/metrics')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIn('checkouts', data['pool'])
+        with self.app.app_context():
+            dialect = db.engine.dialect.name
+        # SQLite files are opened without a pool to meter
+        if dialect != 'sqlite':
+            self.assertEqual(data['pool']['pool'], 'MeteredQueuePool')
+            self.assertTrue(data['pool']['checkouts'] > 0)
+            self.assertIn('saturation', data['pool'])
+
+    # test for answer stats ranking the hardest questions of a category
+    def test_hardest_questions(self):
+        app = create_app({'STATS_FLUSH_SIZE': 1, 'STATS_FLUSH_INTERVAL': 0,
+                          'SQLALCHEMY_DATABASE_URI': self.database_path})
+        client = app.test_client()
+        with app.app_context():
+            question_id = Question.query.filter(Question.category == '1').\
+                order_by(Question.id).first().id
+        for _ in range(5):
+            client.post('/questions/{}/answers'.format(question_id),
+                        json={'correct': False})
+        res = client.get('/categories/1/questions/hardest')
+        data = json.loads(res.data)
+
+        with app.app_context():
+            QuestionStat.query.delete()
+            db.session.commit()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'][0]['id'], question_id)
+        self.assertEqual(data['questions'][0]['answered'], 5)
+        self.assertEqual(data['questions'][0]['correct_rate'], 0)
+
+    # test for answering with no verdict
+    def test_422_for_answer_without_verdict(self):
+        res = self.client().post('/questions/1/answers', json={})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
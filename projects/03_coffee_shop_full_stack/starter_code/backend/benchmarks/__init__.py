@@ -0,0 +1 @@
+'''Benchmarks for the coffee shop API; see README.md for how to run them.'''
@@ -0,0 +1,141 @@
+'''
+Measures the time requires_auth adds to a request, in microseconds, for
+a token granting --permissions permissions:
+
+    legacy       the JWK dict rebuilt, the signature verified and the
+                 permission list scanned on every request (key fetch
+                 not included)
+    verified     the cached public key, the signature verified on every
+                 request and the permission list scanned
+    cached       the current path: the token's Principal from the token
+                 cache and a compiled set check
+
+Keys are generated locally and served from a file, so no Auth0 tenant
+or network access is needed.
+
+    $ python -m benchmarks.auth --permissions 5 50 500
+'''
+import argparse
+import base64
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from Crypto.PublicKey import RSA
+from flask import Flask
+from jose import jwt
+
+KID = 'benchmark'
+private_key = RSA.generate(2048)
+jwks_file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+
+
+def b64(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+JWK = {'kty': 'RSA', 'kid': KID, 'use': 'sig', 'alg': 'RS256',
+       'n': b64(private_key.n), 'e': b64(private_key.e)}
+json.dump({'keys': [JWK]}, jwks_file)
+jwks_file.close()
+# read when the auth module is imported
+os.environ['AUTH0_JWKS_URL'] = 'file://' + jwks_file.name
+
+from src.auth import auth  # noqa: E402
+from src.auth.auth import requires_auth  # noqa: E402
+from src.auth.permissions import all_of, any_of  # noqa: E402
+
+app = Flask(__name__)
+
+
+def make_token(permissions):
+    claims = {
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'sub': 'benchmark',
+        'exp': int(time.time()) + 3600,
+        'permissions': permissions
+    }
+    return jwt.encode(claims, private_key.export_key('PEM').decode(),
+                      algorithm='RS256', headers={'kid': KID})
+
+
+def legacy_auth(required):
+    '''The previous requires_auth, minus fetching jwks.json.'''
+    def wrapper():
+        token = auth.get_token_auth_header()
+        payload = jwt.decode(token, dict(JWK), algorithms=auth.ALGORITHMS,
+                             audience=auth.API_AUDIENCE,
+                             issuer='https://' + auth.AUTH0_DOMAIN + '/')
+        for permission in required:
+            if permission not in payload['permissions']:
+                raise auth.AuthError({'code': 'unauthorized'}, 401)
+        return payload
+    return wrapper
+
+
+def verified_auth(required):
+    def wrapper():
+        payload = auth.verify_decode_jwt(auth.get_token_auth_header())
+        for permission in required:
+            if permission not in payload['permissions']:
+                raise auth.AuthError({'code': 'unauthorized'}, 401)
+        return payload
+    return wrapper
+
+
+def microseconds(func, token, repeat):
+    headers = {'Authorization': 'Bearer ' + token}
+    timings = []
+    with app.test_request_context(headers=headers):
+        func()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--permissions', type=int, nargs='+',
+                        default=[5, 50, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rows = []
+    try:
+        for count in args.permissions:
+            granted = ['perm:{}'.format(i) for i in range(count)]
+            # the last permissions granted, the worst case for a list scan
+            required = granted[-3:]
+            token = make_token(granted)
+            cases = [
+                ('legacy', legacy_auth(required)),
+                ('verified', verified_auth(required)),
+                ('cached', requires_auth(all_of(*required))(
+                    lambda principal: principal)),
+                ('cached any_of', requires_auth(any_of(
+                    'perm:none', all_of(*required)))(
+                    lambda principal: principal)),
+            ]
+            for label, func in cases:
+                rows.append([count, label, '{:.1f}'.format(
+                    microseconds(func, token, args.repeat))])
+    finally:
+        os.unlink(jwks_file.name)
+
+    header = ['permissions', 'path', 'us/request']
+    widths = [max(len(str(cell)) for cell in column)
+              for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width)
+                        for cell, width in zip(row, widths)))
+    print(auth.token_cache.snapshot())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,26 @@
 import os
+import hashlib
+import time
 from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
+from .database.models import db_drop_and_create_all, migrate_recipes, \
+    setup_db, db, Drink, drinks_version
+from .database.db_pool import pool_status
+from .auth.auth import AuthError, requires_auth, token_cache
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
+# seconds a process serves drink listings without seeing changes made by
+# other processes; 0 reuses a listing until this process changes a drink
+DRINKS_CACHE_TTL = float(os.environ.get('DRINKS_CACHE_TTL', 0))
+# serialized listings by form, see drinks_response()
+drink_listings = {}
+
 '''
 uncomment the following line to initialize the datbase
 !! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
@@ -18,6 +28,51 @@ uncomment the following line to initialize the datbase
 '''
 # db_drop_and_create_all()
 
+
+@app.cli.command('migrate-recipes')
+def migrate_recipes_command():
+    """Move recipes from the drink.recipe JSON column into ingredients."""
+    print('{} drinks migrated'.format(migrate_recipes()))
+
+
+def drinks_response(form):
+    """Respond with all drinks in their 'short' or 'long' form.
+
+    The body is serialized once per drinks_version and reused until the
+    version changes or, when DRINKS_CACHE_TTL is set, for at most that
+    many seconds. Its strong ETag is a digest of the body,
+    so every process gives the same tag for the same drinks.
+
+    Returns: 304 without querying the database when If-None-Match holds
+             the current ETag, else the json {"success": True,
+             "drinks": the list of drinks}
+    """
+    version = drinks_version.value
+    listing = drink_listings.get(form)
+    if listing is None or listing['version'] != version or \
+            listing['expires'] <= time.monotonic():
+        drinks = [getattr(drink, form)() for drink in Drink.all_drinks()]
+        body = json.dumps({'success': True, 'drinks': drinks},
+                          separators=(',', ':'), sort_keys=True).encode()
+        expires = time.monotonic() + DRINKS_CACHE_TTL \
+            if DRINKS_CACHE_TTL > 0 else float('inf')
+        listing = {
+            'version': version,
+            'expires': expires,
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest()
+        }
+        drink_listings[form] = listing
+
+    if request.if_none_match.contains_weak(listing['etag']):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(listing['body'],
+                                      mimetype='application/json')
+    response.set_etag(listing['etag'])
+    return response
+
+
 # ROUTES
 '''
 GET /drinks
@@ -36,15 +91,7 @@ def get_drinks():
 
     Returns: json {"success": True, "drinks": the list of drinks}
     """
-    selection = Drink.query.all()
-    drinks = []
-    for drink in selection:
-        drinks.append(drink.short())
-
-    return jsonify({
-        'success': True,
-        'drinks': drinks
-    })
+    return drinks_response('short')
 
 
 '''
@@ -65,15 +112,7 @@ def get_drinks_detail(payload):
 
     Returns: json {"success": True, "drinks": the list of drinks detail}
     """
-    selection = Drink.query.all()
-    drinks = []
-    for drink in selection:
-        drinks.append(drink.long())
-
-    return jsonify({
-        'success': True,
-        'drinks': drinks
-    })
+    return drinks_response('long')
 
 
 '''
@@ -101,17 +140,11 @@ def create_new_drink(payload):
         recipe = body.get('recipe', None)
         print('title:', title, type(title))
         print('recipe:', recipe, type(recipe))
-        # insert new drink
-        if type(recipe) == list:
-            new_drink = Drink(
-                title=title,
-                recipe=json.dumps(recipe)
-            )
-        else:
-            new_drink = Drink(
-                title=title,
-                recipe=json.dumps([recipe])
-            )
+        # insert new drink; a single ingredient may be sent without a list
+        new_drink = Drink(
+            title=title,
+            recipe=recipe
+        )
         new_drink.insert()
 
         return jsonify({
@@ -154,10 +187,7 @@ def update_drink_detail(payload, drink_id):
         if title is not None:
             drink.title = title
         if recipe is not None:
-            if type(recipe) == list:
-                drink.recipe = json.dumps(recipe)
-            else:
-                drink.recipe = json.dumps([recipe])
+            drink.recipe = recipe
 
         drink.update()
 
@@ -201,6 +231,50 @@ def delete_drink(payload, drink_id):
     })
 
 
+'''
+GET /pool/metrics
+    it should be a public endpoint
+    returns status code 200 and json {"success": True, "pool": pool}
+    where pool holds the connection pool size, occupancy, saturation
+    and checkout latency of the serving process
+'''
+
+
+@app.route('/pool/metrics')
+def get_pool_metrics():
+    """Report the database connection pool of this process
+    Arguments: None
+
+    Returns: json {"success": True, "pool": pool status and metrics}
+    """
+    return jsonify({
+        'success': True,
+        'pool': pool_status(db.engine)
+    })
+
+
+'''
+GET /auth/metrics
+    it should be a public endpoint
+    returns status code 200 and json {"success": True, "token_cache": stats}
+    where stats holds the verified-token cache size, hit rate and
+    verification latency of the serving process
+'''
+
+
+@app.route('/auth/metrics')
+def get_auth_metrics():
+    """Report the verified-token cache of this process
+    Arguments: None
+
+    Returns: json {"success": True, "token_cache": cache statistics}
+    """
+    return jsonify({
+        'success': True,
+        'token_cache': token_cache.snapshot()
+    })
+
+
 # Error Handling
 @app.errorhandler(422)
 def unprocessable(error):
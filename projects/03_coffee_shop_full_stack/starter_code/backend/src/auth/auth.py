@@ -1,13 +1,25 @@
-import json
+import os
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSStore, JWKSError, JWKS_TTL
+from .token_cache import TokenCache, TOKEN_CACHE_SIZE
+from .permissions import Principal, compile_permission
 
 
 AUTH0_DOMAIN = 'noradai.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'cafe'
+# e.g. file:///path/to/jwks.json for tests
+JWKS_URL = os.environ.get(
+    'AUTH0_JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+jwks = JWKSStore(JWKS_URL, ALGORITHMS[0],
+                 ttl=int(os.environ.get('AUTH0_JWKS_TTL', JWKS_TTL)))
+# verified payloads of the tokens seen recently, see GET /auth/metrics
+token_cache = TokenCache(
+    int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', TOKEN_CACHE_SIZE)))
 
 # AuthError Exception
 '''
@@ -62,13 +74,15 @@ def get_token_auth_header():
     return token
 
 
-def check_permissions(permission, payload):
-    if 'permissions' not in payload:
+def authorize(check, principal):
+    """Applies a compiled permission check to a Principal.
+    """
+    if not principal.has_permissions:
         raise AuthError({
             'code': 'invalid_claims',
             'description': 'Permissions not included in JWT.'
         }, 400)
-    if permission not in payload['permissions']:
+    if not check(principal.permissions):
         raise AuthError({
             'code': 'unauthorized',
             'description': 'Permission not found.'
@@ -76,33 +90,48 @@ def check_permissions(permission, payload):
     return True
 
 
+def check_permissions(permission, payload):
+    """Checks a payload against a permission string or expression.
+
+    Note: this compiles permission on every call; requires_auth compiles
+          it once when decorating.
+    """
+    if not isinstance(payload, Principal):
+        payload = Principal(payload)
+    return authorize(compile_permission(permission), payload)
+
+
 def verify_decode_jwt(token):
     """Determines if the Access Token is valid.
+
+    The signing key is looked up by the token's kid in the cached key
+    set, see jwks.JWKSStore.
     """
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 400)
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
+    try:
+        rsa_key = jwks.get(unverified_header['kid'])
+    except JWKSError:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
+    if rsa_key is not None:
         try:
             payload = jwt.decode(
                 token,
-                rsa_key,
+                [rsa_key],
                 algorithms=ALGORITHMS,
                 audience=API_AUDIENCE,
                 issuer='https://' + AUTH0_DOMAIN + '/'
@@ -135,14 +164,26 @@ def verify_decode_jwt(token):
     }, 400)
 
 
+def verify_principal(token):
+    return Principal(verify_decode_jwt(token))
+
+
 def requires_auth(permission=''):
+    """Requires a token granting permission, a permission string or an
+    expression such as any_of('patch:drinks', all_of('get:drinks-detail',
+    'post:drinks')).
+
+    The decorated function receives the token's Principal.
+    """
+    check = compile_permission(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
+            principal = token_cache.verify(token, verify_principal)
+            authorize(check, principal)
+            return f(principal, *args, **kwargs)
 
         return wrapper
     return requires_auth_decorator
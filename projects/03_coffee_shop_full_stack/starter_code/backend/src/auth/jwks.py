@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwk
+from jose.exceptions import JWKError
+
+# how long fetched keys are used before they are fetched again
+JWKS_TTL = 600
+# unknown key ids cause at most one fetch per interval, so tokens with
+# made-up key ids cannot make every request fetch the key set
+JWKS_REFETCH_INTERVAL = 30
+JWKS_FETCH_TIMEOUT = 5
+
+
+class JWKSError(Exception):
+    """Raised when the key set cannot be fetched or parsed."""
+
+
+def public_key(key, algorithm):
+    """Builds the verification key of a JWK once.
+
+    Returns: the backend's key object, which jwt.decode accepts inside a
+             list without parsing the JWK again.
+    """
+    constructed = jwk.construct(key, algorithm)
+    return getattr(constructed, 'prepared_key', constructed)
+
+
+class JWKSStore:
+    """Public keys of a JSON Web Key Set, by key id.
+
+    The set is fetched from url (https:// or, for tests, file://) when
+    first needed and kept for ttl seconds. After that a daemon thread
+    refreshes it ahead of expiry, so requests do not wait for the
+    fetch. A key id that is not in the set triggers one more fetch, at
+    most once per refetch_interval, to pick up rotated keys.
+    """
+
+    def __init__(self, url, algorithm='RS256', ttl=JWKS_TTL,
+                 refetch_interval=JWKS_REFETCH_INTERVAL,
+                 timeout=JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.refetch_interval = refetch_interval
+        self.timeout = timeout
+        self.keys = {}
+        self.expires = 0.0
+        self.fetched = None
+        self.fetch_lock = threading.Lock()
+        self.refresher = None
+        self.fetches = 0
+
+    def get(self, kid):
+        """Returns the public key for kid, or None if the set has none."""
+        if self.fetched is None:
+            self.refresh()
+        elif self.expires <= time.monotonic():
+            self.start_refresher()
+        key = self.keys.get(kid)
+        if key is None and self.refetch_allowed():
+            self.refresh(kid)
+            key = self.keys.get(kid)
+        return key
+
+    def refetch_allowed(self):
+        return self.fetched is None or \
+            time.monotonic() - self.fetched >= self.refetch_interval
+
+    def refresh(self, kid=None):
+        """Fetches the key set, unless another thread just did.
+
+        A failed fetch keeps the keys already known; it raises JWKSError
+        only when there are none.
+        """
+        with self.fetch_lock:
+            # a caller waiting on the lock may find the work done
+            if kid is not None and (kid in self.keys or
+                                    not self.refetch_allowed()):
+                return
+            if kid is None and self.expires > time.monotonic():
+                return
+            try:
+                keys = self.fetch()
+            except JWKSError:
+                if not self.keys:
+                    raise
+                # retry when the next request needs the keys
+                self.fetched = time.monotonic()
+                return
+            self.keys = keys
+            self.fetched = time.monotonic()
+            self.expires = self.fetched + self.ttl
+        self.start_refresher()
+
+    def fetch(self):
+        try:
+            with urlopen(self.url, timeout=self.timeout) as response:
+                jwks = json.loads(response.read())
+            keys = {}
+            for key in jwks['keys']:
+                if key.get('use', 'sig') != 'sig' or 'kid' not in key:
+                    continue
+                try:
+                    keys[key['kid']] = public_key(key, self.algorithm)
+                except JWKError:
+                    continue  # e.g. a key of another type in the set
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            raise JWKSError('Unable to fetch {}: {}'.format(self.url, error))
+        self.fetches += 1
+        return keys
+
+    def start_refresher(self):
+        if self.refresher is not None and self.refresher.is_alive():
+            return
+        with self.fetch_lock:
+            if self.refresher is not None and self.refresher.is_alive():
+                return
+            self.refresher = threading.Thread(
+                target=self.refresh_ahead, daemon=True, name='jwks-refresh')
+            self.refresher.start()
+
+    def refresh_ahead(self):
+        # fetch when nine tenths of the ttl have passed
+        while True:
+            wait = self.expires - self.ttl / 10 - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                with self.fetch_lock:
+                    keys = self.fetch()
+                    self.keys = keys
+                    self.fetched = time.monotonic()
+                    self.expires = self.fetched + self.ttl
+            except JWKSError:
+                time.sleep(min(self.refetch_interval, self.ttl / 10))
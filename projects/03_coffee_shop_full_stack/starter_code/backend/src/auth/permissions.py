@@ -0,0 +1,68 @@
+class Principal(dict):
+    """The claims of a verified token, with its permissions as a frozenset.
+
+    Built once per token and cached with it, so permission checks are
+    set operations instead of list scans. It is still the payload dict
+    the routes receive, and must not be modified.
+    """
+
+    def __init__(self, claims):
+        super().__init__(claims)
+        self.has_permissions = 'permissions' in claims
+        self.permissions = frozenset(claims.get('permissions') or ())
+
+
+class all_of:
+    """A permission expression granted when every operand is granted.
+
+    Operands are permission strings or nested all_of/any_of expressions.
+    """
+    combine = all
+
+    def __init__(self, *operands):
+        self.operands = operands
+
+    def compile(self):
+        """Returns a function of a permission frozenset deciding the expression."""
+        names = frozenset(op for op in self.operands if isinstance(op, str))
+        nested = [compile_permission(op) for op in self.operands
+                  if not isinstance(op, str)]
+        check_names = self.check_names(names)
+        if not nested:
+            return check_names
+        combine = type(self).combine
+        checks = ([check_names] if names else []) + nested
+        return lambda granted: combine(check(granted) for check in checks)
+
+    @staticmethod
+    def check_names(names):
+        return names.issubset
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                               ', '.join(map(repr, self.operands)))
+
+
+class any_of(all_of):
+    """A permission expression granted when one of its operands is granted."""
+    combine = any
+
+    @staticmethod
+    def check_names(names):
+        return lambda granted: not names.isdisjoint(granted)
+
+
+def compile_permission(expression):
+    """Compiles a permission string or expression into a check.
+
+    Returns: a function taking the frozenset of granted permissions and
+             returning whether expression is satisfied.
+    """
+    if isinstance(expression, str):
+        expression = all_of(expression)
+    if isinstance(expression, (list, tuple, set, frozenset)):
+        expression = all_of(*expression)
+    if not isinstance(expression, all_of):
+        raise TypeError('Not a permission expression: {!r}'.format(
+            expression))
+    return expression.compile()
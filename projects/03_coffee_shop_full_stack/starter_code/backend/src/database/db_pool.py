@@ -0,0 +1,145 @@
+'''
+Connection pool settings and metrics for Flask-SQLAlchemy apps.
+
+This module is mirrored in projects/01_fyyur/starter_code,
+projects/02_trivia_api/starter/backend,
+projects/03_coffee_shop_full_stack/starter_code/backend/src/database and
+projects/capstone/heroku_sample/starter, since each project is installed
+and deployed on its own. Keep the four copies identical.
+'''
+import os
+import threading
+import time
+from collections import deque
+
+import sqlalchemy.exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+LATENCY_SAMPLES = 1024
+
+
+class PoolMetrics:
+    '''
+    Checkout counts and latencies of this process's connection pool.
+    Latency percentiles cover the last LATENCY_SAMPLES checkouts.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.peak_checked_out = 0
+            self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record_checkout(self, seconds, checked_out):
+        with self.lock:
+            self.checkouts += 1
+            self.latencies.append(seconds)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_timeout(self, seconds):
+        with self.lock:
+            self.timeouts += 1
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'peak_checked_out': self.peak_checked_out
+            }
+
+        def percentile(fraction):
+            index = min(len(latencies) - 1, int(len(latencies) * fraction))
+            return round(latencies[index] * 1000, 3)
+
+        if latencies:
+            snapshot['checkout_ms'] = {
+                'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 3)
+            }
+        return snapshot
+
+
+metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    '''QueuePool that records how long each checkout waits for a connection.'''
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            metrics.record_timeout(time.perf_counter() - start)
+            raise
+        metrics.record_checkout(time.perf_counter() - start,
+                                self.checkedout())
+        return connection
+
+
+def env_flag(value):
+    return str(value).lower() in ('1', 't', 'true', 'yes', 'on')
+
+
+def engine_options(database_uri, environ=os.environ):
+    '''
+    engine_options(database_uri)
+        returns SQLALCHEMY_ENGINE_OPTIONS for database_uri, read from
+        DB_POOL_SIZE (default 5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT
+        (30 seconds), DB_POOL_RECYCLE (1800 seconds) and DB_POOL_PRE_PING
+        (true). Every worker process opens up to DB_POOL_SIZE +
+        DB_MAX_OVERFLOW connections, so size them against the server's
+        max_connections divided by the number of workers.
+    '''
+    options = {
+        'pool_pre_ping': env_flag(environ.get('DB_POOL_PRE_PING', 'true')),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800))
+    }
+    if make_url(database_uri).drivername.startswith('sqlite'):
+        # SQLite connections are per thread or per file; sizes do not apply
+        return options
+    options.update({
+        'poolclass': MeteredQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30))
+    })
+    return options
+
+
+def pool_status(engine):
+    '''
+    pool_status(engine)
+        returns the occupancy of engine's pool together with the checkout
+        metrics. saturation is the share of the pool's capacity (size
+        plus overflow) that is checked out.
+    '''
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        checked_out = pool.checkedout()
+        max_overflow = pool._max_overflow
+        status.update({
+            'size': pool.size(),
+            'max_overflow': max_overflow,
+            'checked_out': checked_out,
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0)
+        })
+        if max_overflow >= 0:
+            capacity = pool.size() + max_overflow
+            status['saturation'] = round(checked_out / capacity, 3) \
+                if capacity else None
+    status.update(metrics.snapshot())
+    return status
@@ -1,6 +1,9 @@
 import os
-from sqlalchemy import Column, String, Integer
+import threading
+from sqlalchemy import Column, String, Integer, ForeignKey, inspect, text
+from sqlalchemy.orm import selectinload
 from flask_sqlalchemy import SQLAlchemy
+from .db_pool import engine_options
 import json
 
 database_filename = "database.db"
@@ -9,6 +12,28 @@ database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filenam
 
 db = SQLAlchemy()
 
+# short and long forms of drinks by id, with the version they were built at
+representations = {}
+
+'''
+TableVersion
+    a counter of the changes this process made to a table through its
+    model. Changes made by other processes are not counted; caches keyed
+    by it must also expire.
+'''
+class TableVersion:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def bump(self):
+        with self.lock:
+            self.value += 1
+
+
+# bumped by Drink.insert(), update() and delete()
+drinks_version = TableVersion()
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -16,6 +41,7 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
 
@@ -28,43 +54,136 @@ db_drop_and_create_all()
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
+    representations.clear()
+    drinks_version.bump()
+
+'''
+migrate_recipes()
+    moves the recipes of a database created before the ingredients table
+    from the drink.recipe JSON column into ingredients rows, and rebuilds
+    the drink table without that column, in one transaction
+    does nothing but create missing tables on a migrated database
+    returns the number of drinks migrated
+'''
+def migrate_recipes():
+    columns = []
+    if 'drink' in inspect(db.engine).get_table_names():
+        columns = [c['name'] for c in inspect(db.engine).get_columns('drink')]
+    if 'recipe' not in columns:
+        db.create_all()
+        return 0
+
+    with db.engine.begin() as connection:
+        legacy = connection.execute(
+            text('SELECT id, title, recipe FROM drink')).fetchall()
+        connection.execute(text('ALTER TABLE drink RENAME TO drink_legacy'))
+        db.metadata.create_all(
+            connection, tables=[Drink.__table__, Ingredient.__table__])
+        ingredients = []
+        for drink_id, title, recipe in legacy:
+            recipe = json.loads(recipe)
+            if isinstance(recipe, dict):
+                recipe = [recipe]
+            ingredients.extend(
+                dict(Ingredient.row(position, part), drink_id=drink_id)
+                for position, part in enumerate(recipe))
+        if legacy:
+            connection.execute(Drink.__table__.insert(), [
+                {'id': drink_id, 'title': title, 'version': 1}
+                for drink_id, title, _ in legacy])
+        if ingredients:
+            connection.execute(Ingredient.__table__.insert(), ingredients)
+        connection.execute(text('DROP TABLE drink_legacy'))
+    representations.clear()
+    drinks_version.bump()
+    return len(legacy)
 
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
 '''
 class Drink(db.Model):
+    # ids are not reused, so a cached form cannot outlive its drink
+    __table_args__ = {'sqlite_autoincrement': True}
+
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
-    # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    # incremented by update(), so cached forms of older versions are rebuilt
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # the recipe, one row per ingredient in recipe order
+    ingredients = db.relationship(
+        'Ingredient', order_by='Ingredient.position',
+        cascade='all, delete-orphan')
+
+    '''
+    recipe
+        the ingredients as [{'color': string, 'name':string, 'parts':number}]
+        assigning a list (or a single ingredient dict) replaces them
+    '''
+    @property
+    def recipe(self):
+        return [ingredient.format() for ingredient in self.ingredients]
+
+    @recipe.setter
+    def recipe(self, recipe):
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        self.ingredients = [Ingredient(**Ingredient.row(position, part))
+                            for position, part in enumerate(recipe)]
+
+    '''
+    representations()
+        the (version, short form, long form) of the drink, built once per
+        version and shared by every request; callers must not modify them
+    '''
+    def representations(self):
+        cached = representations.get(self.id)
+        if cached is not None and cached[0] == self.version:
+            return cached
+        recipe = self.recipe
+        cached = (self.version, {
+            'id': self.id,
+            'title': self.title,
+            'recipe': [{'color': r['color'], 'parts': r['parts']}
+                       for r in recipe]
+        }, {
+            'id': self.id,
+            'title': self.title,
+            'recipe': recipe
+        })
+        representations[self.id] = cached
+        return cached
+
+    '''
+    all_drinks()
+        all drinks by id, with the ingredients of those whose forms are
+        not cached at their current version loaded in one query
+    '''
+    @classmethod
+    def all_drinks(cls):
+        drinks = cls.query.order_by(cls.id).all()
+        stale = [drink.id for drink in drinks
+                 if representations.get(drink.id, (None,))[0] != drink.version]
+        if stale:
+            cls.query.options(selectinload(cls.ingredients)).\
+                filter(cls.id.in_(stale)).all()
+        return drinks
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return self.representations()[1]
 
     '''
     long()
         long form representation of the Drink model
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return self.representations()[2]
 
     '''
     insert()
@@ -78,6 +197,7 @@ class Drink(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        drinks_version.bump()
 
     '''
     delete()
@@ -90,6 +210,8 @@ class Drink(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        representations.pop(self.id, None)
+        drinks_version.bump()
 
     '''
     update()
@@ -99,9 +221,49 @@ class Drink(db.Model):
             drink = Drink.query.filter(Drink.id == id).one_or_none()
             drink.title = 'Black Coffee'
             drink.update()
+        the version is incremented in SQL, so concurrent updates each count
     '''
     def update(self):
+        self.version = Drink.version + 1
         db.session.commit()
+        drinks_version.bump()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+Ingredient
+one part of a drink's recipe
+'''
+class Ingredient(db.Model):
+    __tablename__ = 'ingredients'
+
+    id = Column(Integer, primary_key=True)
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='CASCADE'),
+                      nullable=False, index=True)
+    # order within the recipe
+    position = Column(Integer, nullable=False)
+    name = Column(String(80), nullable=False)
+    color = Column(String(40), nullable=False)
+    parts = Column(Integer, nullable=False)
+
+    '''
+    row(position, part)
+        the column values of a recipe part {'color', 'name', 'parts'}
+        raises KeyError or ValueError for a malformed part
+    '''
+    @staticmethod
+    def row(position, part):
+        return {
+            'position': position,
+            'name': str(part['name']),
+            'color': str(part['color']),
+            'parts': int(part['parts'])
+        }
+
+    def format(self):
+        return {
+            'color': self.color,
+            'name': self.name,
+            'parts': self.parts
+        }
@@ -0,0 +1,341 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+from sqlalchemy import event
+
+KID = 'test'
+private_key = RSA.generate(2048)
+directory = tempfile.mkdtemp(prefix='coffee-')
+
+
+def b64(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def write_jwks(path, *kids):
+    keys = [{'kty': 'RSA', 'kid': kid, 'use': 'sig', 'alg': 'RS256',
+             'n': b64(private_key.n), 'e': b64(private_key.e)}
+            for kid in kids]
+    with open(path, 'w') as jwks_file:
+        json.dump({'keys': keys}, jwks_file)
+    return 'file://' + path
+
+
+# both are read when the app is imported: the key set by the auth module,
+# the database path by setup_db()
+os.environ['AUTH0_JWKS_URL'] = write_jwks(
+    os.path.join(directory, 'jwks.json'), KID)
+from src.database import models  # noqa: E402
+models.database_path = 'sqlite:///' + os.path.join(directory, 'database.db')
+
+from src.api import app  # noqa: E402
+from src.auth import auth  # noqa: E402
+from src.auth.jwks import JWKSError, JWKSStore  # noqa: E402
+from src.auth.token_cache import TokenCache  # noqa: E402
+from src.database.models import db, db_drop_and_create_all, Drink, \
+    migrate_recipes  # noqa: E402
+
+ALL_PERMISSIONS = ['get:drinks-detail', 'post:drinks', 'patch:drinks',
+                   'delete:drinks']
+
+
+def make_token(permissions=ALL_PERMISSIONS, kid=KID, expires_in=3600):
+    claims = {
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'sub': 'test',
+        'exp': int(time.time()) + expires_in,
+        'permissions': permissions
+    }
+    return jwt.encode(claims, private_key.export_key('PEM').decode(),
+                      algorithm='RS256', headers={'kid': kid})
+
+
+def tearDownModule():
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class JWKSStoreTestCase(unittest.TestCase):
+    """Tests of the cached Auth0 key set"""
+
+    def setUp(self):
+        self.path = os.path.join(directory, 'store.json')
+        self.store = JWKSStore(write_jwks(self.path, 'a'))
+
+    def test_keys_are_fetched_once(self):
+        self.assertIsNotNone(self.store.get('a'))
+        self.assertIsNotNone(self.store.get('a'))
+        self.assertEqual(self.store.fetches, 1)
+
+    def test_set_is_refreshed_ahead_of_expiry(self):
+        store = JWKSStore(write_jwks(self.path, 'a'), ttl=0.5)
+        store.get('a')
+        write_jwks(self.path, 'a', 'b')
+
+        deadline = time.monotonic() + 2
+        while store.fetches < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # the refresher fetches once nine tenths of the ttl have passed
+        self.assertEqual(store.fetches, 2)
+        self.assertIn('b', store.keys)
+
+    def test_unknown_kid_refetches_once_per_interval(self):
+        self.store.get('a')
+        write_jwks(self.path, 'a', 'rotated')
+
+        # rotated keys are not looked for until the interval has passed
+        self.assertIsNone(self.store.get('rotated'))
+        self.store.fetched -= self.store.refetch_interval
+        self.assertIsNotNone(self.store.get('rotated'))
+        self.assertIsNone(self.store.get('made-up'))
+        self.assertIsNone(self.store.get('made-up'))
+        self.assertEqual(self.store.fetches, 2)
+
+    def test_failed_fetch_keeps_known_keys(self):
+        key = self.store.get('a')
+        os.remove(self.path)
+        self.store.fetched -= self.store.refetch_interval
+
+        self.assertIsNone(self.store.get('b'))
+        self.assertIs(self.store.get('a'), key)
+
+    def test_failed_fetch_without_keys_raises(self):
+        store = JWKSStore('file://' + os.path.join(directory, 'missing'))
+
+        with self.assertRaises(JWKSError):
+            store.get('a')
+
+
+class RequiresAuthTestCase(unittest.TestCase):
+    """Tests of requires_auth against the key set"""
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def get_detail(self, token):
+        return self.client.get('/drinks-detail', headers={
+            'Authorization': 'Bearer ' + token})
+
+    def test_unavailable_key_set_answers_503(self):
+        jwks = auth.jwks
+        auth.jwks = JWKSStore('file://' + os.path.join(directory, 'missing'))
+        try:
+            res = self.get_detail(make_token())
+        finally:
+            auth.jwks = jwks
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.get_json()['message'], 'jwks_unavailable')
+
+    def test_unknown_kid_answers_400(self):
+        res = self.get_detail(make_token(kid='unknown'))
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_malformed_token_answers_400(self):
+        res = self.get_detail('not-a-token')
+
+        self.assertEqual(res.status_code, 400)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """Tests of the cache of verified token payloads"""
+
+    def setUp(self):
+        self.cache = TokenCache(max_entries=2)
+        self.calls = []
+
+    def verify(self, token, exp=None):
+        def verify_token(token):
+            self.calls.append(token)
+            payload = {'sub': token}
+            if exp is not None:
+                payload['exp'] = exp
+            return payload
+        return self.cache.verify(token, verify_token)
+
+    def test_payload_is_reused_until_exp(self):
+        payload = self.verify('a', exp=time.time() + 60)
+
+        self.assertIs(self.verify('a', exp=time.time() + 60), payload)
+        self.assertEqual(self.calls, ['a'])
+        self.cache.entries[self.cache.key('a')] = (time.time() - 1, payload)
+        self.verify('a', exp=time.time() + 60)
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual(self.cache.snapshot()['expirations'], 1)
+
+    def test_tokens_without_exp_are_not_cached(self):
+        self.verify('a')
+        self.verify('a')
+
+        self.assertEqual(self.calls, ['a', 'a'])
+
+    def test_least_recently_used_token_is_evicted(self):
+        exp = time.time() + 60
+        self.verify('a', exp)
+        self.verify('b', exp)
+        self.verify('a', exp)
+        self.verify('c', exp)
+
+        self.verify('a', exp)
+        self.verify('b', exp)
+        self.assertEqual(self.calls, ['a', 'b', 'c', 'b'])
+        self.assertEqual(self.cache.snapshot()['evictions'], 2)
+
+    def test_expired_tokens_are_evicted_first(self):
+        self.verify('a', time.time() + 60)
+        self.verify('b', time.time() + 0.05)
+        time.sleep(0.1)
+        self.verify('a', time.time() + 60)
+        self.verify('c', time.time() + 60)
+
+        self.verify('a', time.time() + 60)
+        self.assertEqual(self.calls, ['a', 'b', 'c'])
+        self.assertEqual(self.cache.snapshot()['expirations'], 1)
+        self.assertEqual(self.cache.snapshot()['evictions'], 0)
+
+    def test_errors_are_not_cached(self):
+        def fail(token):
+            self.calls.append(token)
+            raise ValueError(token)
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.verify('a', fail)
+        self.assertEqual(self.calls, ['a', 'a'])
+
+
+class DrinksTestCase(unittest.TestCase):
+    """Tests of the drink endpoints and their cached listings"""
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.headers = {'Authorization': 'Bearer ' + make_token()}
+        with app.app_context():
+            db_drop_and_create_all()
+            Drink(title='water', recipe=[
+                {'name': 'water', 'color': 'blue', 'parts': 1}]).insert()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+
+    def get_drinks(self, path='/drinks', etag=None):
+        headers = dict(self.headers)
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return self.client.get(path, headers=headers)
+
+    def test_get_drinks_sends_etag_and_answers_304(self):
+        res = self.get_drinks()
+        etag = res.headers['ETag']
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['drinks'], [
+            {'id': 1, 'title': 'water',
+             'recipe': [{'color': 'blue', 'parts': 1}]}])
+        res = self.get_drinks(etag=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(res.headers['ETag'], etag)
+
+    def test_cached_listing_does_not_query_the_database(self):
+        etag = self.get_drinks().headers['ETag']
+        statements = []
+
+        def before_cursor_execute(*args):
+            statements.append(args[2])
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            self.assertEqual(self.get_drinks(etag=etag).status_code, 304)
+            self.assertEqual(self.get_drinks().status_code, 200)
+        finally:
+            event.remove(engine, 'before_cursor_execute',
+                         before_cursor_execute)
+        self.assertEqual(statements, [])
+
+    def test_drinks_detail_requires_auth_before_304(self):
+        etag = self.get_drinks('/drinks-detail').headers['ETag']
+
+        res = self.client.get('/drinks-detail',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(self.get_drinks('/drinks-detail', etag).status_code,
+                         304)
+
+    def test_writes_change_the_etag(self):
+        etags = [self.get_drinks().headers['ETag']]
+
+        res = self.client.post('/drinks', headers=self.headers, json={
+            'title': 'mocha',
+            'recipe': [{'name': 'coffee', 'color': 'brown', 'parts': 1}]})
+        self.assertEqual(res.status_code, 200)
+        res = self.get_drinks(etag=etags[-1])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([drink['title'] for drink in
+                          res.get_json()['drinks']], ['water', 'mocha'])
+        etags.append(res.headers['ETag'])
+
+        res = self.client.patch('/drinks/1', headers=self.headers,
+                                json={'title': 'still water'})
+        self.assertEqual(res.status_code, 200)
+        res = self.get_drinks(etag=etags[-1])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['drinks'][0]['title'], 'still water')
+        etags.append(res.headers['ETag'])
+
+        res = self.client.delete('/drinks/2', headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        res = self.get_drinks(etag=etags[-1])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.get_json()['drinks']), 1)
+        etags.append(res.headers['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_migrate_recipes_moves_json_recipes_to_ingredients(self):
+        with app.app_context():
+            db.drop_all()
+            db.session.execute(
+                'CREATE TABLE drink (id INTEGER PRIMARY KEY, '
+                'title VARCHAR(80) UNIQUE, recipe VARCHAR(180) NOT NULL)')
+            db.session.execute(
+                "INSERT INTO drink VALUES (1, 'latte', :latte), "
+                "(3, 'water', :water)",
+                {'latte': json.dumps([
+                    {'name': 'espresso', 'color': 'brown', 'parts': 1},
+                    {'name': 'milk', 'color': 'white', 'parts': 3}]),
+                 'water': json.dumps(
+                    {'name': 'water', 'color': 'blue', 'parts': 1})})
+            db.session.commit()
+
+            self.assertEqual(migrate_recipes(), 2)
+            self.assertEqual(migrate_recipes(), 0)
+
+        res = self.get_drinks('/drinks-detail')
+        self.assertEqual(res.get_json()['drinks'], [
+            {'id': 1, 'title': 'latte', 'recipe': [
+                {'name': 'espresso', 'color': 'brown', 'parts': 1},
+                {'name': 'milk', 'color': 'white', 'parts': 3}]},
+            {'id': 3, 'title': 'water', 'recipe': [
+                {'name': 'water', 'color': 'blue', 'parts': 1}]}])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import os
-from flask import Flask
-from models import setup_db
+from flask import Flask, jsonify
+from flask_cors import CORS
+from models import db, setup_db
+from db_pool import pool_status
 
 def create_app(test_config=None):
 
@@ -19,6 +21,10 @@ def create_app(test_config=None):
     def be_cool():
         return "Be cool, man, be coooool! You're almost a FSND grad!"
 
+    @app.route('/pool/metrics')
+    def pool_metrics():
+        return jsonify(pool_status(db.engine))
+
     return app
 
 app = create_app()